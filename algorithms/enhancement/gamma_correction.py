@@ -1,10 +1,12 @@
 import cv2
-import numpy as np
+
+from algorithms.enhancement.point_operations import apply_table, gamma_table, image_depth
 
 class GammaCorrection:
     """
     伽马校正
     通过非线性变换调整图像亮度和对比度
+    校正由点运算引擎编译为查找表，8位和16位灰度图都只做一次查表
     """
     
     def __init__(self):
@@ -15,7 +17,7 @@ class GammaCorrection:
         应用伽马校正
         
         参数:
-            image: 输入图像 (灰度或彩色)
+            image: 输入图像 (灰度或彩色，8位；灰度图也可以是16位)
             gamma: 伽马值 (>1增加亮度, <1降低亮度)
         
         返回:
@@ -25,15 +27,7 @@ class GammaCorrection:
         if len(image.shape) > 2:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         else:
-            gray = image.copy()
-        
-        # 归一化到0-1范围
-        normalized = gray / 255.0
-        
-        # 应用伽马校正
-        corrected = np.power(normalized, 1.0/gamma)
-        
-        # 转换回0-255范围
-        corrected = np.uint8(corrected * 255)
+            gray = image
         
-        return corrected
\ No newline at end of file
+        # 8位图像只有256个灰度，预先计算每个灰度的校正结果 (按伽马值缓存)，再一次查表
+        return apply_table(gray, gamma_table(float(gamma), image_depth(gray)))
\ No newline at end of file
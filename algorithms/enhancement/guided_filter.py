@@ -0,0 +1,190 @@
+import math
+
+import cv2
+import numpy as np
+
+class GuidedFilter:
+    """
+    引导滤波
+    以图像自身为引导图的边缘保持平滑 (He等, 2010)，所有局部统计量都由盒式滤波得到，
+    耗时与半径无关；也可选用双边网格 (Paris和Durand, 2006) 实现的快速双边滤波。
+    平滑结果与原图的差即细节层，按detail放大后加回可做细节增强。
+    """
+    
+    # 平滑方式
+    METHODS = ("guided", "bilateral_grid")
+    # 双边网格灰度方向的最小单元 (归一化灰度)，限制网格深度不超过约64层
+    GRID_MIN_RANGE = 1.0 / 64
+    # 双边网格每个方向两侧留出的空单元数，等于网格模糊核的半宽
+    GRID_PADDING = 2
+    # 网格模糊核，近似标准差为1个单元的高斯核
+    GRID_KERNEL = np.float32([1, 4, 6, 4, 1]) / 16
+    # cv2.remap的源图像和输出图像宽高都必须小于SHRT_MAX
+    REMAP_MAX_COLS = 32767
+    
+    def __init__(self):
+        pass
+    
+    def process(self, image, radius=8, eps=0.01, detail=0.0, method="guided", **kwargs):
+        """
+        应用引导滤波
+        
+        参数:
+            image: 输入图像 (灰度或彩色)
+            radius: 窗口半径 (像素)；双边网格模式下为空间标准差
+            eps: 正则化参数，灰度归一化到[0,1]后的方差尺度；
+                局部方差远小于eps的区域被平滑，远大于eps的边缘被保留。
+                双边网格模式下灰度标准差取sqrt(eps)
+            detail: 细节增益，输出 = 平滑 + detail * (原图 - 平滑)；
+                0为纯平滑 (默认)，1为原图，大于1时增强细节
+            method: 平滑方式
+                "guided": 引导滤波 (默认)
+                "bilateral_grid": 双边网格快速双边滤波
+        
+        返回:
+            处理后的图像
+        """
+        # 确保图像是灰度图
+        if len(image.shape) > 2:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+        
+        if method not in self.METHODS:
+            raise ValueError(f"未知的平滑方式: {method}")
+        
+        # 归一化到[0,1]，eps与图像位深无关
+        normalized = np.float32(gray) * np.float32(1.0 / 255)
+        if method == "guided":
+            smoothed = self.guided(normalized, radius, eps)
+        else:
+            smoothed = self.bilateral_grid(normalized, radius, math.sqrt(eps))
+        
+        # 平滑 + detail * (原图 - 平滑)，合并为一次加权求和
+        result = cv2.addWeighted(normalized, detail, smoothed, 1.0 - detail, 0)
+        return cv2.convertScaleAbs(np.clip(result, 0, 1, out=result), alpha=255)
+    
+    def guided(self, image, radius, eps):
+        """
+        以图像自身为引导图的引导滤波
+        
+        每个窗口内输出是引导图的线性变换 q = a * I + b，a = 方差 / (方差 + eps)，b = (1 - a) * 均值；
+        均值、平方均值和两个系数的窗口平均共4次盒式滤波，盒式滤波用滑动求和，耗时与半径无关
+        
+        参数:
+            image: float32灰度图像，灰度范围[0,1]
+            radius: 窗口半径
+            eps: 正则化参数
+        
+        返回:
+            float32平滑图像
+        """
+        size = (2 * int(radius) + 1,) * 2
+        mean = cv2.boxFilter(image, -1, size, borderType=cv2.BORDER_REFLECT)
+        square = cv2.sqrBoxFilter(image, cv2.CV_32F, size, borderType=cv2.BORDER_REFLECT)
+        
+        # 局部方差，浮点舍入可能使其略小于0
+        variance = cv2.subtract(square, cv2.multiply(mean, mean))
+        np.maximum(variance, 0, out=variance)
+        
+        a = cv2.divide(variance, cv2.add(variance, float(eps)))
+        b = cv2.subtract(mean, cv2.multiply(a, mean))
+        
+        # 每个像素被多个窗口覆盖，取各窗口系数的平均
+        mean_a = cv2.boxFilter(a, -1, size, borderType=cv2.BORDER_REFLECT)
+        mean_b = cv2.boxFilter(b, -1, size, borderType=cv2.BORDER_REFLECT)
+        return cv2.add(cv2.multiply(mean_a, image), mean_b)
+    
+    def bilateral_grid(self, image, sigma_space, sigma_range):
+        """
+        双边网格快速双边滤波
+        
+        像素按 (行/sigma_space, 列/sigma_space, 灰度/sigma_range) 累加到三维网格 (灰度和计数)，
+        网格沿三个方向做高斯模糊后，在每个像素的位置三线性插值并相除。
+        网格大小随sigma_space增大而减小，总耗时为O(N)，不随半径增长
+        
+        参数:
+            image: float32灰度图像，灰度范围[0,1]
+            sigma_space: 空间标准差 (像素)
+            sigma_range: 灰度标准差 (归一化灰度)
+        
+        返回:
+            float32平滑图像
+        """
+        height, width = image.shape
+        sigma_space = max(float(sigma_space), 1.0)
+        sigma_range = max(float(sigma_range), self.GRID_MIN_RANGE)
+        pad = self.GRID_PADDING
+        
+        # 每个像素在网格中的连续坐标
+        rows = np.arange(height, dtype=np.float32) / np.float32(sigma_space) + pad
+        cols = np.arange(width, dtype=np.float32) / np.float32(sigma_space) + pad
+        levels = image / np.float32(sigma_range) + pad
+        shape = (int(rows[-1]) + pad + 2, int(cols[-1]) + pad + 2, int(1.0 / sigma_range) + 2 * pad + 2)
+        
+        # 最近邻累加：每个像素落入最近的网格单元，分别累加灰度和与像素数
+        cells = ((np.rint(rows).astype(np.intp)[:, None] * shape[1]
+                  + np.rint(cols).astype(np.intp)[None, :]) * shape[2]
+                 + np.rint(levels).astype(np.intp)).ravel()
+        size = shape[0] * shape[1] * shape[2]
+        grid = np.empty(shape + (2,), dtype=np.float32)
+        grid[..., 0] = np.bincount(cells, weights=image.ravel(), minlength=size).reshape(shape)
+        grid[..., 1] = np.bincount(cells, minlength=size).reshape(shape)
+        
+        for axis in range(3):
+            grid = self._blur_axis(grid, axis)
+        
+        # 三线性插值，灰度和与像素数作为一对值一起取出
+        sliced = self._interpolate(grid, rows, cols, levels)
+        weight = sliced[..., 1]
+        np.maximum(weight, np.float32(1e-6), out=weight)
+        return cv2.divide(sliced[..., 0], weight)
+    
+    def _blur_axis(self, grid, axis):
+        """
+        沿网格的一个方向做GRID_KERNEL卷积；两侧的空单元保证卷积不越界
+        """
+        kernel = self.GRID_KERNEL
+        half = len(kernel) // 2
+        grid = np.moveaxis(grid, axis, 0)
+        blurred = np.zeros_like(grid)
+        length = grid.shape[0]
+        for offset, weight in enumerate(kernel):
+            blurred[half:length - half] += weight * grid[offset:length - 2 * half + offset]
+        return np.moveaxis(blurred, 0, axis)
+    
+    def _interpolate(self, grid, rows, cols, levels):
+        """
+        在每个像素的网格坐标处三线性插值
+        
+        网格按 (行, 灰度层, 列) 排成一幅宽为 灰度层数 * 列数 的双通道图像，
+        同一像素相邻两个灰度层上的行列双线性插值各用一次cv2.remap完成，再沿灰度方向线性插值；
+        列方向两侧的空单元保证插值不会跨到相邻灰度层。
+        cv2.remap要求源图像宽度小于REMAP_MAX_COLS，网格较宽 (小半径、大图像) 时按灰度层分段，
+        每段只插值灰度层落在段内的像素
+        """
+        height, width = levels.shape
+        columns = grid.shape[1]
+        planes = np.ascontiguousarray(grid.transpose(0, 2, 1, 3)).reshape(grid.shape[0], -1, 2)
+        level_index = levels.astype(np.int32)
+        level_frac = cv2.subtract(levels, level_index, dtype=cv2.CV_32F)
+        
+        map_y = rows[:, None].repeat(width, axis=1)
+        map_x = cv2.add(np.float32(level_index * columns), cols[None, :].repeat(height, axis=0))
+        
+        # 每段的灰度层数，段内还要包含下一层作为上层
+        band = max(1, (self.REMAP_MAX_COLS - 1) // columns - 1)
+        lowest, highest = int(level_index.min()), int(level_index.max())
+        result = None
+        for start in range(lowest, highest + 1, band):
+            source = planes[:, start * columns:(start + band + 1) * columns]
+            offset_x = map_x - np.float32(start * columns) if start else map_x
+            lower = cv2.remap(source, offset_x, map_y, cv2.INTER_LINEAR)
+            upper = cv2.remap(source, offset_x + np.float32(columns), map_y, cv2.INTER_LINEAR)
+            sliced = lower + level_frac[..., None] * (upper - lower)
+            if result is None:
+                result = sliced
+            else:
+                inside = (level_index >= start) & (level_index < start + band)
+                np.copyto(result, sliced, where=inside[..., None])
+        return result
\ No newline at end of file
@@ -1,6 +1,8 @@
 import cv2
 import numpy as np
 
+from algorithms.enhancement.point_operations import PointOperations
+
 class HistogramEqualization:
     """
     直方图均衡化算法
@@ -8,14 +10,14 @@ class HistogramEqualization:
     """
     
     def __init__(self):
-        pass
+        self.point_operations = PointOperations()
     
     def process(self, image, **kwargs):
         """
         应用直方图均衡化
         
         参数:
-            image: 输入图像 (灰度或彩色)
+            image: 输入图像 (灰度或彩色，8位；灰度图也可以是16位)
         
         返回:
             处理后的图像
@@ -27,6 +29,9 @@ class HistogramEqualization:
             gray = image.copy()
         
         # 应用直方图均衡化
+        if gray.dtype == np.uint16:
+            # cv2.equalizeHist只支持8位图像，16位图像由点运算引擎按65536项的映射表均衡化
+            return self.point_operations.process(gray, [("equalize", {})])
         equalized = cv2.equalizeHist(gray)
         
         return equalized
\ No newline at end of file
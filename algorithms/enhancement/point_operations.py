@@ -0,0 +1,196 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+def _max_value(depth):
+    """
+    位深对应的最大灰度值
+    """
+    if depth not in (8, 16):
+        raise ValueError(f"不支持的位深: {depth}")
+    return (1 << depth) - 1
+
+def _dtype(depth):
+    return np.uint8 if depth == 8 else np.uint16
+
+def image_depth(image):
+    """
+    灰度图像的位深 (8或16)
+    """
+    if image.dtype == np.uint8:
+        return 8
+    if image.dtype == np.uint16:
+        return 16
+    raise ValueError(f"点运算只支持8位或16位图像，输入为{image.dtype}")
+
+@lru_cache(maxsize=64)
+def gamma_table(gamma, depth=8):
+    """
+    伽马校正查找表：输出 = (输入/最大值)^(1/gamma) * 最大值，截断取整
+    与逐像素计算的结果逐位相同
+    
+    参数:
+        gamma: 伽马值 (>1增加亮度, <1降低亮度)
+        depth: 输入和输出的位深 (8或16)
+    
+    返回:
+        只读查找表，长度为 2^depth
+    """
+    max_value = _max_value(depth)
+    normalized = np.arange(max_value + 1) / float(max_value)
+    table = (np.power(normalized, 1.0 / gamma) * max_value).astype(_dtype(depth))
+    table.flags.writeable = False
+    return table
+
+@lru_cache(maxsize=64)
+def window_table(level, width, depth=8, output_depth=8):
+    """
+    窗宽窗位查找表：[level - width/2, level + width/2] 线性映射到输出的全部灰度范围，窗外截断
+    
+    参数:
+        level: 窗位 (窗口中心，输入灰度单位)
+        width: 窗宽 (>0)
+        depth: 输入位深 (8或16)
+        output_depth: 输出位深，16位图像一般映射到8位显示
+    
+    返回:
+        只读查找表，长度为 2^depth
+    """
+    if width <= 0:
+        raise ValueError("窗宽必须大于0")
+    output_max = _max_value(output_depth)
+    values = np.arange(_max_value(depth) + 1, dtype=np.float64)
+    scaled = (values - (level - width / 2.0)) * (output_max / float(width))
+    table = np.clip(np.rint(scaled), 0, output_max).astype(_dtype(output_depth))
+    table.flags.writeable = False
+    return table
+
+def equalization_table(hist, depth=8):
+    """
+    由直方图计算直方图均衡化查找表，8位时与cv2.equalizeHist的映射相同：
+    最小灰度映射为0，其余灰度按累计像素数线性映射到最大值 (四舍五入)
+    
+    参数:
+        hist: 各灰度的像素数，长度为 2^depth
+        depth: 位深 (8或16)
+    
+    返回:
+        查找表
+    """
+    max_value = _max_value(depth)
+    hist = np.asarray(hist, dtype=np.int64).ravel()
+    nonzero = np.flatnonzero(hist)
+    table = np.zeros(max_value + 1, dtype=_dtype(depth))
+    if nonzero.size == 0:
+        return table
+    first = nonzero[0]
+    total = int(hist.sum())
+    if hist[first] == total:
+        # 单一灰度的图像保持不变
+        table[:] = first
+        return table
+    scale = max_value / float(total - hist[first])
+    cumulative = np.cumsum(hist[first + 1:])
+    table[first + 1:] = np.clip(np.rint(cumulative * scale), 0, max_value)
+    return table
+
+def compose(*tables):
+    """
+    复合查找表：依次应用tables中的映射等价于应用一次返回的查找表
+    每个表的长度必须覆盖前一个表的输出范围
+    """
+    result = tables[0]
+    for table in tables[1:]:
+        result = table[result]
+    return result
+
+def apply_table(image, table):
+    """
+    对图像应用查找表：8位图像使用一次cv2.LUT，16位图像使用一次数组索引
+    """
+    if image.dtype == np.uint8 and table.size == 256:
+        return cv2.LUT(image, table)
+    return table[image]
+
+class PointOperations:
+    """
+    点运算引擎
+    将伽马校正、窗宽窗位、直方图均衡化等逐像素灰度映射编译为查找表
+    (8位图像256项，16位图像65536项)，按参数缓存，串联的多个运算先复合为一张表，
+    再对图像只做一次查表。
+    """
+    
+    # 支持的运算及其参数
+    OPERATIONS = ("gamma", "window", "equalize")
+    
+    def __init__(self):
+        # 最近一次运算复合得到的查找表
+        self.last_table = None
+    
+    def compile(self, operations, depth=8, hist=None):
+        """
+        把一串点运算复合为一张查找表
+        
+        参数:
+            operations: 列表 [(运算名, 参数字典), ...]，按顺序应用
+                "gamma": {"gamma"}
+                "window": {"level", "width", "output_depth"(可选，默认8)}
+                "equalize": {}，由输入直方图经前面的运算变换后计算
+            depth: 输入位深 (8或16)
+            hist: 输入图像的直方图，运算中有"equalize"时需要
+        
+        返回:
+            查找表，长度为 2^depth
+        """
+        table = np.arange(_max_value(depth) + 1, dtype=_dtype(depth))
+        current = depth
+        for name, params in operations:
+            if name == "gamma":
+                step = gamma_table(float(params["gamma"]), current)
+            elif name == "window":
+                output_depth = params.get("output_depth", 8)
+                step = window_table(float(params["level"]), float(params["width"]), current, output_depth)
+                current = output_depth
+            elif name == "equalize":
+                if hist is None:
+                    raise ValueError("直方图均衡化需要输入图像的直方图")
+                # 前面运算输出的直方图：按查找表把输入直方图的计数累加到输出灰度上
+                mapped = np.bincount(table, weights=hist, minlength=_max_value(current) + 1)
+                step = equalization_table(mapped, current)
+            else:
+                raise ValueError(f"未知的点运算: {name}")
+            table = compose(table, step)
+        return table
+    
+    def process(self, image, operations=(), **kwargs):
+        """
+        对图像应用一串点运算
+        
+        参数:
+            image: 输入图像 (灰度或彩色，8位；灰度图也可以是16位)
+            operations: 运算列表，见compile
+        
+        返回:
+            处理后的图像，位深由最后一个改变位深的运算决定 (默认与输入相同)
+        """
+        # 确保图像是灰度图
+        if len(image.shape) > 2:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+        
+        depth = image_depth(gray)
+        hist = None
+        if any(name == "equalize" for name, _ in operations):
+            hist = self.histogram(gray)
+        self.last_table = self.compile(operations, depth, hist)
+        return apply_table(gray, self.last_table)
+    
+    def histogram(self, gray):
+        """
+        灰度直方图，长度为 2^位深
+        """
+        if gray.dtype == np.uint8:
+            return cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+        return np.bincount(gray.ravel(), minlength=_max_value(image_depth(gray)) + 1)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import math
+
 import cv2
 import numpy as np
 
@@ -7,17 +9,28 @@ class UnsharpMasking:
     通过从原始图像中减去模糊版本来增强边缘
     """
     
+    # 模糊方式
+    BLUR_METHODS = ("auto", "gaussian", "box")
+    # "auto"模式下使用叠加盒式滤波的最小半径；更小的半径下精确高斯模糊更快
+    BOX_MIN_RADIUS = 8
+    # 近似高斯核叠加的盒式滤波次数
+    BOX_PASSES = 3
+    
     def __init__(self):
         pass
     
-    def process(self, image, radius=5, amount=1.5, **kwargs):
+    def process(self, image, radius=5, amount=1.5, blur="auto", **kwargs):
         """
         应用非锐化掩蔽
         
         参数:
             image: 输入图像 (灰度或彩色)
-            radius: 高斯模糊的半径
+            radius: 高斯模糊的半径 (标准差)
             amount: 锐化强度
+            blur: 模糊方式
+                "gaussian": 精确高斯模糊，耗时随半径增长
+                "box": 叠加BOX_PASSES次盒式滤波近似高斯模糊，耗时与半径无关
+                "auto": 半径小于BOX_MIN_RADIUS时用"gaussian"，否则用"box" (默认)
         
         返回:
             处理后的图像
@@ -26,15 +39,53 @@ class UnsharpMasking:
         if len(image.shape) > 2:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         else:
-            gray = image.copy()
+            gray = image
         
         # 创建模糊版本
-        blurred = cv2.GaussianBlur(gray, (0, 0), radius)
+        blurred = self.blur(gray, radius, blur)
+        
+        # 原始 + amount * (原始 - 模糊) 合并为一次加权求和，在浮点下计算后再饱和为8位，
+        # 掩蔽的负值 (边缘暗侧) 不会被截断
+        sharpened = cv2.addWeighted(gray, 1.0 + amount, blurred, -amount, 0, dtype=cv2.CV_8U)
         
-        # 计算掩蔽 (原始 - 模糊)
-        mask = cv2.subtract(gray, blurred)
+        return sharpened
+    
+    def blur(self, gray, radius, method="auto"):
+        """
+        高斯模糊
         
-        # 应用掩蔽到原始图像
-        sharpened = cv2.addWeighted(gray, 1.0, mask, amount, 0)
+        参数:
+            gray: 灰度图像
+            radius: 高斯核标准差
+            method: 模糊方式，见process
         
-        return sharpened
\ No newline at end of file
+        返回:
+            模糊图像，"gaussian"为与输入相同类型，"box"为float32
+        """
+        if method == "auto":
+            method = "box" if radius >= self.BOX_MIN_RADIUS else "gaussian"
+        if method == "gaussian":
+            return cv2.GaussianBlur(gray, (0, 0), radius)
+        if method == "box":
+            # 盒式滤波用积分 (滑动求和) 实现，每个像素的开销与窗口大小无关
+            blurred = np.float32(gray)
+            for size in self.box_sizes(radius):
+                blurred = cv2.blur(blurred, (size, size))
+            return blurred
+        raise ValueError(f"未知的模糊方式: {method}")
+    
+    def box_sizes(self, sigma):
+        """
+        叠加后方差最接近sigma^2的BOX_PASSES个奇数盒式滤波窗口边长
+        边长取相邻的两个奇数wl、wl+2，按方差选择各用几次
+        """
+        passes = self.BOX_PASSES
+        ideal = math.sqrt(12.0 * sigma * sigma / passes + 1)
+        lower = int(ideal)
+        if lower % 2 == 0:
+            lower -= 1
+        lower = max(lower, 1)
+        upper = lower + 2
+        count = round((12.0 * sigma * sigma - passes * lower * lower - 4 * passes * lower - 3 * passes) / (-4 * lower - 4))
+        count = min(max(count, 0), passes)
+        return [lower] * count + [upper] * (passes - count)
\ No newline at end of file
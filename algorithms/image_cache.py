@@ -0,0 +1,103 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def image_key(image):
+    """
+    计算图像内容的缓存键
+
+    参数:
+        image: 输入图像 (numpy数组)
+
+    返回:
+        由形状、数据类型和像素数据哈希组成的元组
+    """
+    data = np.ascontiguousarray(image)
+    # sha256在支持SHA扩展指令的CPU上是hashlib中最快的摘要算法
+    digest = hashlib.sha256(memoryview(data).cast("B")).hexdigest()
+    return (data.shape, data.dtype.str, digest)
+
+
+def _nbytes(value):
+    """
+    估计缓存值占用的内存 (只统计其中的numpy数组)
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class ImageCache:
+    """
+    按图像内容缓存中间结果的LRU缓存
+    同时限制条目数量和总内存，超出时淘汰最久未使用的条目
+    各方法加锁，模块级缓存可以被多个线程 (如批量测量的线程池) 同时使用
+    """
+
+    def __init__(self, max_entries=4, max_bytes=256 * 1024 * 1024):
+        """
+        参数:
+            max_entries: 最多缓存的条目数
+            max_bytes: 缓存数组的总字节数上限
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        查询缓存，命中时返回缓存值并标记为最近使用，否则返回None
+        """
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        """
+        写入缓存，单个条目超过内存上限时不缓存
+        """
+        size = _nbytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def _remove(self, key):
+        # 调用方已持有锁
+        del self._entries[key]
+        self.total_bytes -= self._sizes.pop(key)
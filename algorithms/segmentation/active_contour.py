@@ -1,20 +1,84 @@
+import time
 import cv2 as cv
 import numpy as np
+from functools import lru_cache
 from matplotlib import pyplot as plt
+
+from algorithms.image_cache import ImageCache, image_key
 # # 解决窗口中文乱码
 # cv.namedWindow("dummy", cv.WINDOW_NORMAL)
 # cv.destroyWindow("dummy")
 # cv.waitKey(1)
-def getGaussianPE(src):
-    """ 描述：计算负高斯势能(Negative Gaussian Potential Energy, NGPE) 输入：单通道灰度图src 输出：无符号的浮点型单通道，取值0.0 ~ 255.0 """
-    imblur = cv.GaussianBlur(src, ksize=(5, 5), sigmaX=3)
-    dx = cv.Sobel(imblur, cv.CV_16S, 1, 0)  # X方向上取一阶导数，16位有符号数，卷积核3x3
-    dy = cv.Sobel(imblur, cv.CV_16S, 0, 1)
+
+# 外力场缓存，键为(图像内容, 模糊核大小, 模糊sigma, 外力类型)
+_force_cache = ImageCache(max_entries=8, max_bytes=256 * 1024 * 1024)
+
+def getGaussianPE(src, ksize=5, sigma=3):
+    """ 描述：计算负高斯势能(Negative Gaussian Potential Energy, NGPE) 输入：单通道灰度图src，高斯模糊核大小ksize和标准差sigma 输出：无符号的浮点型单通道，取值0.0 ~ 255.0 """
+    imblur = cv.GaussianBlur(src, ksize=(ksize, ksize), sigmaX=sigma)
+    dx = cv.Sobel(imblur, cv.CV_32F, 1, 0)  # X方向上取一阶导数，32位浮点数避免平方溢出，卷积核3x3
+    dy = cv.Sobel(imblur, cv.CV_32F, 0, 1)
     E = dx**2 + dy**2
-    return E
+    return E * (255.0 / max(float(E.max()), 1e-12))
+
+def getExternalForce(img, ksize=5, sigma=3, mode="gradient"):
+    """ 描述：计算Snake的外力场，结果按图像内容、模糊参数和外力类型缓存，同一图像重复运行时直接复用 输入：单通道灰度图img，高斯模糊核大小ksize和标准差sigma，外力类型mode("gradient"为负高斯势能的梯度并按最大值归一化，"gvf"为梯度向量流并归一化为单位向量) 输出：HxWx2的float32外力场(fx, fy) """
+    key = (image_key(img), ksize, sigma, mode)
+    force = _force_cache.get(key)
+    if force is not None:
+        return force
+    if mode == "gradient":
+        # 计算负高斯势能矩阵，及其梯度
+        E_ext = -getGaussianPE(img, ksize, sigma)
+        fx = cv.Sobel(E_ext, cv.CV_32F, 1, 0)
+        fy = cv.Sobel(E_ext, cv.CV_32F, 0, 1)
+        T = max(float(np.max(np.abs(fx))), float(np.max(np.abs(fy))), 1e-12)
+        force = np.dstack([fx, fy]) / np.float32(T)
+    elif mode == "gvf":
+        # 以归一化的高斯势能为边缘图扩散梯度；远离边缘处场很弱但方向可靠，只保留方向
+        force = getGVF(getGaussianPE(img, ksize, sigma) / 255.0)
+        norm = np.sqrt(force[..., 0] ** 2 + force[..., 1] ** 2)
+        force /= np.maximum(norm, 1e-12)[..., None]
+    else:
+        raise ValueError(f"未知的外力类型: {mode}")
+    _force_cache.put(key, force)
+    return force
+
+def relaxGVF(v, grad, spacing, mu, iterations):
+    """ 描述：GVF方程 mu*Lap(v) - |grad|^2 (v - grad) = 0 的向量化迭代，扩散项显式(步长取稳定上限)、数据项隐式，两个分量作为双通道一次处理 输入：初值v(HxWx2 float32，原地更新)，边缘图梯度grad，网格间距spacing(全分辨率像素)，正则化系数mu，迭代次数iterations 输出：更新后的v """
+    # 时间步长 dt = spacing^2 / (4*mu)，扩散项系数恰为1/4
+    c = (grad[..., 0] ** 2 + grad[..., 1] ** 2) * np.float32(spacing * spacing / (4 * mu))
+    source = grad * c[..., None]
+    denom = np.repeat((1 / (1 + c))[..., None], 2, axis=2)
+    lap = np.empty_like(v)
+    for _ in range(iterations):
+        cv.Laplacian(v, cv.CV_32F, dst=lap, ksize=1, borderType=cv.BORDER_REPLICATE)
+        cv.scaleAdd(lap, 0.25, v, dst=v)
+        cv.add(v, source, dst=v)
+        cv.multiply(v, denom, dst=v)
+    return v
+
+def getGVF(edge, mu=0.2, iterations=40, min_size=64):
+    """ 描述：由粗到细(cascadic多重网格)求解梯度向量流(Gradient Vector Flow)：最粗层迭代iterations次，逐层插值到更细层作为初值，每细一层迭代次数减半，远距离扩散在粗网格上以大步长完成 输入：边缘图edge(取值0~1的单通道)，正则化系数mu，最粗层迭代次数iterations，最粗层最小边长min_size 输出：HxWx2的float32梯度向量流(u, v) """
+    edge = np.float32(edge)
+    pyramid = [edge]
+    while min(pyramid[-1].shape[:2]) >= 2 * min_size:
+        pyramid.append(cv.pyrDown(pyramid[-1]))
+    v = None
+    n = iterations
+    for level in range(len(pyramid) - 1, -1, -1):
+        spacing = 2.0 ** level
+        # 在各层边缘图上求梯度，按全分辨率像素换算
+        grad = np.dstack([cv.Sobel(pyramid[level], cv.CV_32F, 1, 0, scale=0.125 / spacing),
+                          cv.Sobel(pyramid[level], cv.CV_32F, 0, 1, scale=0.125 / spacing)])
+        h, w = grad.shape[:2]
+        v = grad.copy() if v is None else cv.resize(v, (w, h), interpolation=cv.INTER_LINEAR)
+        v = relaxGVF(v, grad, spacing, mu, n)
+        n = max(n // 2, 4)
+    return v
 
 def getDiagCycleMat(alpha, beta, n):
-    """ 计算5对角循环矩阵 """
+    """ 计算5对角循环矩阵 (稠密形式，snake改用getCycleEigvals和solveCycle做FFT求解，此处作为测试中的对照) """
     a = 2 * alpha + 6 * beta
     b = -(alpha + 4 * beta)
     c = beta
@@ -23,6 +87,20 @@ def getDiagCycleMat(alpha, beta, n):
     diag_mat_c = c * np.roll(np.eye(n), 2, 0) + c * np.roll(np.eye(n), -2, 0)
     return diag_mat_a + diag_mat_b + diag_mat_c
 
+@lru_cache(maxsize=32)
+def getCycleEigvals(alpha, beta, gamma, n):
+    """ 描述：计算5对角循环矩阵 A + gamma*I 的特征值，即其首行的实数DFT，用于FFT求解 输入：弹力系数alpha，刚性系数beta，迭代步长gamma，点数n 输出：长度为n//2+1的实数数组 """
+    a = 2 * alpha + 6 * beta
+    b = -(alpha + 4 * beta)
+    c = beta
+    w = 2 * np.pi * np.arange(n // 2 + 1) / n
+    return gamma + a + 2 * b * np.cos(w) + 2 * c * np.cos(2 * w)
+
+def solveCycle(eigvals, rhs):
+    """ 描述：利用循环矩阵可被DFT对角化的性质，以O(nlogn)求解 (A + gamma*I) v = rhs 输入：getCycleEigvals的特征值，右端项rhs(最后一维为轮廓点) 输出：与rhs同形状的解 """
+    n = rhs.shape[-1]
+    return np.fft.irfft(np.fft.rfft(rhs, axis=-1) / eigvals, n=n, axis=-1)
+
 def getCircleContour(centre=(0, 0), radius=(1, 1), N=200):
     """ 以参数方程的形式，获取n个离散点围成的圆形/椭圆形轮廓 输入：中心centre=（x0, y0）, 半轴长radius=(a, b)， 离散点数N 输出：由离散点坐标(x, y)组成的2xN矩阵 """
     t = np.linspace(0, 2 * np.pi, N)
@@ -30,38 +108,81 @@ def getCircleContour(centre=(0, 0), radius=(1, 1), N=200):
     y = centre[1] + radius[1] * np.sin(t)
     return np.array([x, y])
 
-def snake(img, snake, alpha=0.5, beta=0.1, gamma=0.1, max_iter=2500, convergence=0.01):
-    """ 根据Snake模型的隐式格式进行迭代 输入：弹力系数alpha，刚性系数beta，迭代步长gamma，最大迭代次数max_iter，收敛阈值convergence 输出：由收敛轮廓坐标(x, y)组成的2xN矩阵， 历次迭代误差list """
-    x, y, errs = snake[0].copy(), snake[1].copy(), []
-    n = len(x)
-    # 计算5对角循环矩阵A，及其相关逆阵
-    A = getDiagCycleMat(alpha, beta, n)
-    inv = np.linalg.inv(A + gamma * np.eye(n))
-    # 初始化
-    y_max, x_max = img.shape
-    max_px_move = 1.0
-    # 计算负高斯势能矩阵，及其梯度
-    E_ext = -getGaussianPE(img)
-    fx = cv.Sobel(E_ext, cv.CV_16S, 1, 0)
-    fy = cv.Sobel(E_ext, cv.CV_16S, 0, 1)
-    T = np.max([abs(fx), abs(fy)])
-    fx, fy = fx / T, fy / T
+def bilinearSample(field, x, y):
+    """ 描述：在亚像素坐标(x, y)处对HxWxC的场做向量化双线性插值，越界坐标截断到图像边界 输入：场field，任意形状的坐标数组x、y 输出：形状为x.shape + (C,)的插值结果 """
+    h, w = field.shape[:2]
+    x = np.clip(x, 0, w - 1)
+    y = np.clip(y, 0, h - 1)
+    # 坐标非负，截断取整即向下取整；右/下边界上的点归入最后一个格子
+    x0 = np.minimum(x.astype(np.intp), max(w - 2, 0))
+    y0 = np.minimum(y.astype(np.intp), max(h - 2, 0))
+    x1 = np.minimum(x0 + 1, w - 1)
+    y1 = np.minimum(y0 + 1, h - 1)
+    wx = (x - x0)[..., None]
+    wy = (y - y0)[..., None]
+    top = field[y0, x0] * (1 - wx) + field[y0, x1] * wx
+    bottom = field[y1, x0] * (1 - wx) + field[y1, x1] * wx
+    return top * (1 - wy) + bottom * wy
+
+def snake(img, snake, alpha=0.5, beta=0.1, gamma=0.1, max_iter=2500, convergence=0.01, blur_ksize=5, blur_sigma=3, force="gradient"):
+    """ 根据Snake模型的隐式格式进行迭代，支持多条轮廓同时演化 输入：初始轮廓snake(2xN，或多条轮廓堆叠成的Kx2xN)，弹力系数alpha，刚性系数beta，迭代步长gamma，最大迭代次数max_iter，收敛阈值convergence，外力场的高斯模糊参数blur_ksize、blur_sigma，外力类型force("gradient"或"gvf") 输出：收敛轮廓坐标x、y(单条轮廓为长度N的数组，多条轮廓为KxN数组)， 历次迭代误差list(多条轮廓时取最大值) """
+    contours = np.asarray(snake, dtype=np.float64)
+    batched = contours.ndim == 3
+    pos = contours.copy() if batched else contours[None].copy()
+    errs = []
+    n = pos.shape[-1]
+    # 5对角循环矩阵 A + gamma*I 的特征值，每次迭代用FFT求解，无需构造和求逆n×n矩阵
+    eigvals = getCycleEigvals(alpha, beta, gamma, n)
+    # 外力场 (同一图像和模糊参数下直接取缓存)
+    field = getExternalForce(img, blur_ksize, blur_sigma, force)
+    if force == "gvf":
+        # GVF为单位向量场，乘以gamma后每次迭代沿场方向移动约1像素，避免在边缘两侧来回振荡
+        field = field * np.float32(gamma)
     for g in range(max_iter):
-        x_pre, y_pre = x.copy(), y.copy()
-        i, j = np.uint8(y), np.uint8(x)
-        try:
-            xn = inv @ (gamma * x + fx[i, j])
-            yn = inv @ (gamma * y + fy[i, j])
-        except Exception as e:
-            print("索引超出范围")
-        # 判断收敛
-        x, y = xn, yn
-        err = np.mean(0.5 * np.abs(x_pre - x) + 0.5 * np.abs(y_pre - y))
+        # 所有轮廓的所有点一次双线性采样，得到Kx2xN的外力
+        f = np.moveaxis(bilinearSample(field, pos[:, 0], pos[:, 1]), -1, 1)
+        # 所有轮廓的x、y方程组共用同一组特征值，一次FFT同时求解
+        pos_new = solveCycle(eigvals, gamma * pos + f)
+        # 判断收敛：每条轮廓的平均位移，取最大值
+        err = np.abs(pos_new - pos).mean(axis=(1, 2)).max()
+        pos = pos_new
         errs.append(err)
         if err < convergence:
             print(f"Snake迭代{g}次后，趋于收敛。\t err = {err:.3f}")
             break
-    return x, y, errs
+    if batched:
+        return pos[:, 0], pos[:, 1], errs
+    return pos[0, 0], pos[0, 1], errs
+
+def snakePyramid(img, snake_init, levels=3, alpha=0.5, beta=0.1, gamma=0.1, max_iter=2500, convergence=0.01, blur_ksize=5, blur_sigma=3, force="gradient"):
+    """ 描述：由粗到细的多分辨率Snake，先在图像金字塔最粗层收敛，再逐层放大轮廓并在更细层细化 输入：图像img，初始轮廓snake_init(全分辨率坐标，2xN或Kx2xN)，金字塔层数levels(0表示仅全分辨率)，其余参数同snake，max_iter为每层的最大迭代次数 输出：全分辨率下的收敛轮廓坐标x、y，每层统计信息list(层号、尺寸、迭代次数、耗时) """
+    # 构建图像金字塔，pyramid[0]为原图
+    pyramid = [img]
+    for _ in range(levels):
+        if min(pyramid[-1].shape[:2]) < 32:
+            break
+        pyramid.append(cv.pyrDown(pyramid[-1]))
+    # 初始轮廓缩放到最粗层
+    h0, w0 = img.shape[:2]
+    hc, wc = pyramid[-1].shape[:2]
+    contour = np.asarray(snake_init, dtype=np.float64).copy()
+    contour[..., 0, :] *= wc / w0
+    contour[..., 1, :] *= hc / h0
+    stats = []
+    for level in range(len(pyramid) - 1, -1, -1):
+        start = time.perf_counter()
+        x, y, errs = snake(pyramid[level], contour, alpha=alpha, beta=beta, gamma=gamma, max_iter=max_iter, convergence=convergence,
+                           blur_ksize=blur_ksize, blur_sigma=blur_sigma, force=force)
+        h, w = pyramid[level].shape[:2]
+        stats.append({"level": level, "size": (w, h), "iterations": len(errs), "time": time.perf_counter() - start})
+        print(f"金字塔第{level}层 ({w}x{h})：迭代{len(errs)}次，耗时{stats[-1]['time'] * 1000:.1f}ms")
+        contour = np.stack([x, y], axis=-2)
+        # 放大到下一更细层
+        if level > 0:
+            hf, wf = pyramid[level - 1].shape[:2]
+            contour[..., 0, :] *= wf / w
+            contour[..., 1, :] *= hf / h
+    return contour[..., 0, :], contour[..., 1, :], stats
 
 
 class ActiveContour:
@@ -71,79 +192,38 @@ class ActiveContour:
     """
 
     def __init__(self):
-        self.selected_points = []
-        self.is_selecting = False
+        # 最近一次运行的每层统计 (层号、尺寸、迭代次数、耗时)
+        self.last_stats = []
 
-    def select_initial_contour(self, image):
+    @staticmethod
+    def points_to_contour(points, n=200):
         """
-        允许用户手动选择初始轮廓的点
+        将用户选择的点转换为适合snake算法的轮廓
+        选点本身在界面(ImageViewer)上通过鼠标事件完成，这里只做插值
 
         参数:
-            image: 输入图像
+            points: 用户选择的点 [(x, y), ...]，至少6个
+            n: 插值后的轮廓点数
 
         返回:
-            包含用户选择点的轮廓数组
+            由轮廓坐标(x, y)组成的2xN数组，点数不足时返回None
         """
-        # 创建一个窗口用于选择点
-        window_name = "Select Initial Contour Points (At least 6 points, Press Enter to confirm)"
-        self.selected_points = []
-        self.is_selecting = True
-        clone = image.copy()
-
-        # 鼠标回调函数
-        def mouse_callback(event, x, y, flags, param):
-            if not self.is_selecting:
-                return
-                
-            if event == cv.EVENT_LBUTTONDOWN:
-                self.selected_points.append((x, y))
-                # 在图像上标记选择的点
-                cv.circle(clone, (x, y), 3, (0, 255, 0), -1)
-                # 如果有多个点，绘制连接线
-                if len(self.selected_points) > 1:
-                    cv.line(clone, self.selected_points[-2], self.selected_points[-1], (0, 255, 0), 1)
-                # 如果至少有3个点，连接第一个点和最后一个点形成闭合轮廓
-                if len(self.selected_points) > 2:
-                    cv.line(clone, self.selected_points[0], self.selected_points[-1], (0, 255, 0), 1, cv.LINE_AA)
-                cv.imshow(window_name, clone)
-
-        # 创建窗口并设置鼠标回调
-        cv.namedWindow(window_name)
-        cv.setMouseCallback(window_name, mouse_callback)
-        cv.imshow(window_name, clone)
-
-        # 等待用户选择点并按Enter确认
-        while self.is_selecting:
-            key = cv.waitKey(1) & 0xFF
-            if key == 13:  # Enter键
-                if len(self.selected_points) >= 6:  # 至少需要6个点
-                    self.is_selecting = False
-                else:
-                    print("请至少选择6个点")
-            elif key == 27:  # Esc键
-                self.selected_points = []
-                self.is_selecting = False
-
-        cv.destroyWindow(window_name)
-
-        # 如果用户取消选择或没有选择足够的点，返回None
-        if not self.selected_points or len(self.selected_points) < 6:
+        if points is None or len(points) < 6:
             return None
 
-        # 将选择的点转换为适合snake算法的格式
-        points = np.array(self.selected_points)
+        points = np.array(points)
         x = points[:, 0]
         y = points[:, 1]
 
         # 使用插值增加点的数量，使轮廓更平滑
         t = np.arange(len(x))
-        t_interp = np.linspace(0, len(x) - 1, 200)
+        t_interp = np.linspace(0, len(x) - 1, n)
         x_interp = np.interp(t_interp, t, x, period=len(x))
         y_interp = np.interp(t_interp, t, y, period=len(x))
 
         return np.array([x_interp, y_interp])
 
-    def process(self, image, iterations=100, alpha=0.15, beta=0.10, manual_init=True, **kwargs):
+    def process(self, image, iterations=100, alpha=0.15, beta=0.10, init_points=None, init_contours=None, pyramid_levels=0, force="gradient", **kwargs):
         """
         应用主动轮廓分割
 
@@ -152,7 +232,10 @@ class ActiveContour:
             iterations: 迭代次数
             alpha: 曲线的弹性参数
             beta: 曲线的刚性参数
-            manual_init: 是否手动选择初始轮廓
+            init_points: 用户手动选择的初始轮廓点 [(x, y), ...]，不足6个时使用默认椭圆
+            init_contours: 多条初始轮廓 (Kx2xN数组，如左右两肺)，给定时同时演化并忽略init_points
+            pyramid_levels: 金字塔层数，大于0时先在低分辨率收敛再逐层细化，iterations为每层的最大迭代次数
+            force: 外力类型，"gradient"为负高斯势能梯度，"gvf"为梯度向量流 (捕获范围大，初始轮廓可远离边界)
 
         返回:
             分割后的图像
@@ -169,22 +252,25 @@ class ActiveContour:
         center_y, center_x = h // 2, w // 2
         radius_y, radius_x = h // 3, w // 3
 
-        # 如果启用手动选择，让用户选择初始轮廓
-        if manual_init:
-            init = self.select_initial_contour(image if len(image.shape) > 2 else cv.cvtColor(gray, cv.COLOR_GRAY2BGR))
+        # 给定多条初始轮廓时直接使用
+        if init_contours is not None:
+            init = np.asarray(init_contours, dtype=np.float64)
+        # 使用用户手动选择的点
+        else:
+            init = self.points_to_contour(init_points)
 
-        # 如果用户没有选择或取消选择，使用默认椭圆轮廓
+        # 如果用户没有选择或选择的点不足，使用默认椭圆轮廓
         if init is None:
             init = getCircleContour((center_x, center_y), (radius_x, radius_y), N=200)
 
         # 应用主动轮廓
         try:
-            x, y, _ = snake(gray, snake=init, alpha=alpha, beta=beta, gamma=0.1, max_iter=iterations)
+            x, y, self.last_stats = snakePyramid(gray, init, levels=pyramid_levels, alpha=alpha, beta=beta, gamma=0.1, max_iter=iterations, force=force)
 
-            # 创建掩码
+            # 创建掩码，多条轮廓时逐条填充
             mask = np.zeros_like(gray)
-            snake_int = np.rint(np.array([x, y]).T).astype(np.int32)
-            cv.fillPoly(mask, [snake_int], 255)
+            contours = np.rint(np.stack([x, y], axis=-1)).astype(np.int32)
+            cv.fillPoly(mask, list(contours.reshape(-1, contours.shape[-2], 2)), 255)
 
             # 应用掩码到原始图像
             segmented = cv.bitwise_and(gray, gray, mask=mask)
@@ -194,9 +280,9 @@ class ActiveContour:
             print(f"主动轮廓算法失败: {str(e)}")
             # 如果主动轮廓失败，返回简单的椭圆分割或用户选择的轮廓
             mask = np.zeros_like(gray)
-            if manual_init and self.selected_points and len(self.selected_points) >= 3:
+            if init_points is not None and len(init_points) >= 3:
                 # 使用用户选择的点创建掩码
-                points = np.array(self.selected_points).reshape((-1, 1, 2)).astype(np.int32)
+                points = np.array(init_points).reshape((-1, 1, 2)).astype(np.int32)
                 cv.fillPoly(mask, [points], 255)
             else:
                 # 使用默认椭圆
@@ -0,0 +1,252 @@
+import argparse
+import csv
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from algorithms.segmentation.image_io import is_image_file
+from algorithms.segmentation.postprocessing import MaskPostprocessing
+
+# 逐幅图像报表的列
+FIELDS = ("algorithm", "file", "dice", "iou", "hausdorff", "hausdorff95", "time")
+
+# 汇总统计的指标
+SUMMARY_METRICS = ("dice", "iou", "hausdorff", "hausdorff95")
+
+def _grow_lungs(region_growing, image):
+    """
+    区域生长：种子放在左右肺野中央 (与水平集初始椭圆的中心相同)，两个种子同时竞争生长
+    """
+    h, w = image.shape[:2]
+    seeds = [(w * 3 // 10, h * 9 // 20), (w * 7 // 10, h * 9 // 20)]
+    labels = region_growing.process_multi(image, seeds, thresholds=10)
+    return cv2.bitwise_and(image, image, mask=cv2.compare(labels, 0, cv2.CMP_GT))
+
+def segmentation_algorithms():
+    """
+    可批量运行的分割算法，值为 (类, 运行函数)
+    运行函数以 (算法实例, 灰度图像) 调用，返回分割结果；参数为各算法适合胸片的默认值
+    """
+    from algorithms.segmentation.active_contour import ActiveContour
+    from algorithms.segmentation.level_set import LevelSet
+    from algorithms.segmentation.region_growing import RegionGrowing
+    from algorithms.segmentation.thresholding import Thresholding
+    from algorithms.segmentation.unet import UNet
+    from algorithms.segmentation.watershed import Watershed
+    return {
+        "thresholding": (Thresholding, lambda algorithm, image: algorithm.process(image, method="otsu", threshold_type=1)),
+        "region_growing": (RegionGrowing, _grow_lungs),
+        "watershed": (Watershed, lambda algorithm, image: algorithm.process(image)),
+        "active_contour": (ActiveContour, lambda algorithm, image: algorithm.process(image)),
+        "unet": (UNet, lambda algorithm, image: algorithm.process(image)),
+        "level_set": (LevelSet, lambda algorithm, image: algorithm.process(image)),
+    }
+
+def segmentation_metrics(predicted, truth):
+    """
+    计算一对分割结果的Dice、IoU和Hausdorff距离
+    
+    Hausdorff距离按表面 (边界像素) 计算：一个掩码的边界像素到另一个掩码边界的距离由
+    距离变换一次得到，hausdorff为两个方向距离的最大值，hausdorff95为两个方向距离95百分位数的较大者。
+    距离变换只在两个掩码的外接矩形内计算，结果与整幅图像相同。
+    
+    参数:
+        predicted: 分割结果，非零像素为前景
+        truth: 真值掩码，非零像素为前景，尺寸不同时将predicted最近邻缩放到truth的尺寸
+    
+    返回:
+        字典 {dice, iou, hausdorff, hausdorff95}，距离单位为像素；
+        两者都为空时Dice、IoU为1、距离为0，只有一个为空时距离为nan
+    """
+    if predicted.shape[:2] != truth.shape[:2]:
+        predicted = cv2.resize(predicted, (truth.shape[1], truth.shape[0]), interpolation=cv2.INTER_NEAREST)
+    a = cv2.compare(predicted, 0, cv2.CMP_GT)
+    b = cv2.compare(truth, 0, cv2.CMP_GT)
+    count_a = cv2.countNonZero(a)
+    count_b = cv2.countNonZero(b)
+    intersection = cv2.countNonZero(cv2.bitwise_and(a, b))
+    total = count_a + count_b
+    if total == 0:
+        return {"dice": 1.0, "iou": 1.0, "hausdorff": 0.0, "hausdorff95": 0.0}
+    result = {"dice": 2 * intersection / total, "iou": intersection / (total - intersection)}
+    if count_a == 0 or count_b == 0:
+        result.update(hausdorff=math.nan, hausdorff95=math.nan)
+        return result
+    
+    x, y, w, h = cv2.boundingRect(cv2.bitwise_or(a, b))
+    a, b = a[y:y + h, x:x + w], b[y:y + h, x:x + w]
+    # 边界像素：掩码减去其4邻域腐蚀
+    cross = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+    edge_a = cv2.subtract(a, cv2.erode(a, cross, borderType=cv2.BORDER_CONSTANT, borderValue=0))
+    edge_b = cv2.subtract(b, cv2.erode(b, cross, borderType=cv2.BORDER_CONSTANT, borderValue=0))
+    # 到另一个掩码边界的欧氏距离 (边界像素处为0)
+    to_b = cv2.distanceTransform(cv2.bitwise_not(edge_b), cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    to_a = cv2.distanceTransform(cv2.bitwise_not(edge_a), cv2.DIST_L2, cv2.DIST_MASK_PRECISE)
+    a_to_b = to_b[edge_a > 0]
+    b_to_a = to_a[edge_b > 0]
+    result.update(hausdorff=float(max(a_to_b.max(), b_to_a.max())),
+                  hausdorff95=float(max(np.percentile(a_to_b, 95), np.percentile(b_to_a, 95))))
+    return result
+
+def find_pairs(truth_dir, source_dir, mask_suffix=""):
+    """
+    按文件名 (不含扩展名) 配对真值掩码和预测结果或原始图像
+    
+    参数:
+        truth_dir: 真值掩码目录
+        source_dir: 预测结果或原始图像目录
+        mask_suffix: 真值文件名相对图像文件名多出的后缀，如"_mask"
+    
+    返回:
+        [(真值路径, 对应文件路径), ...]，按真值文件名排序；没有对应文件的真值被跳过
+    """
+    sources = {os.path.splitext(f)[0]: f for f in os.listdir(source_dir) if is_image_file(f)}
+    pairs = []
+    for name in sorted(f for f in os.listdir(truth_dir) if is_image_file(f)):
+        stem = os.path.splitext(name)[0]
+        if mask_suffix and stem.endswith(mask_suffix):
+            stem = stem[:-len(mask_suffix)]
+        if stem in sources:
+            pairs.append((os.path.join(truth_dir, name), os.path.join(source_dir, sources[stem])))
+    return pairs
+
+# 工作进程的状态，由_init_worker设置
+_worker = {}
+
+def _init_worker(algorithm, postprocess):
+    """
+    工作进程初始化：每个进程创建自己的分割算法和后处理实例 (U-Net的模型会话也按进程加载)
+    """
+    _worker["run"] = None
+    if algorithm is not None:
+        algorithm_class, run = segmentation_algorithms()[algorithm]
+        _worker["algorithm"] = algorithm_class()
+        _worker["run"] = run
+    _worker["postprocessing"] = MaskPostprocessing() if postprocess else None
+
+def _evaluate_pair(pair):
+    """
+    在工作进程中读取一对图像并计算指标，读取失败时返回None
+    """
+    truth_path, source_path = pair
+    start = time.perf_counter()
+    truth = cv2.imread(truth_path, cv2.IMREAD_GRAYSCALE)
+    source = cv2.imread(source_path, cv2.IMREAD_GRAYSCALE)
+    if truth is None or source is None:
+        return None
+    predicted = source
+    if _worker["run"] is not None:
+        predicted = _worker["run"](_worker["algorithm"], source)
+    if _worker["postprocessing"] is not None:
+        predicted = _worker["postprocessing"].process(source, predicted)
+    result = segmentation_metrics(predicted, truth)
+    result["file"] = os.path.basename(truth_path)
+    result["time"] = time.perf_counter() - start
+    return result
+
+def summarize(rows):
+    """
+    汇总一个算法的逐幅结果
+    
+    返回:
+        字典：count、failed (有一方为空、距离为nan的图像数)，各指标的mean、std、median、p05、p95
+        (忽略nan)，以及每幅图像的平均耗时time
+    """
+    summary = {"count": len(rows)}
+    for metric in SUMMARY_METRICS:
+        values = np.array([row[metric] for row in rows], dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if metric == "hausdorff":
+            summary["failed"] = len(rows) - values.size
+        stats = (np.mean(values), np.std(values), np.median(values), *np.percentile(values, [5, 95])) \
+            if values.size else (math.nan,) * 5
+        for name, value in zip(("mean", "std", "median", "p05", "p95"), stats):
+            summary[f"{metric}_{name}"] = float(value)
+    summary["time"] = float(np.mean([row["time"] for row in rows])) if rows else math.nan
+    return summary
+
+def evaluate(truth_dir, sources, output_path=None, mask_suffix="", postprocess=False, workers=None, chunksize=8):
+    """
+    批量评估分割质量
+    
+    每个来源的图像对按文件名交给进程池，工作进程自行读取、分割和计算指标，主进程只传递路径；
+    结果按文件名顺序流式写入逐幅报表，不在内存中保留图像。
+    
+    参数:
+        truth_dir: 真值掩码目录
+        sources: 列表 [(名称, 目录, 算法名或None), ...]；算法名为None时目录中为预测结果，
+            否则为原始图像，由该分割算法 (见segmentation_algorithms) 在工作进程中分割
+        output_path: 逐幅报表的CSV路径，为None时不写出
+        mask_suffix: 真值文件名的后缀
+        postprocess: 计算指标前是否做分割后处理
+        workers: 进程数，为None时使用CPU核数
+        chunksize: 每次分发给工作进程的图像对数
+    
+    返回:
+        字典 {名称: summarize的汇总结果}
+    """
+    summaries = {}
+    report = open(output_path, "w", newline="", encoding="utf-8") if output_path else None
+    try:
+        writer = None
+        if report is not None:
+            writer = csv.DictWriter(report, fieldnames=FIELDS)
+            writer.writeheader()
+        for name, source_dir, algorithm in sources:
+            pairs = find_pairs(truth_dir, source_dir, mask_suffix)
+            rows = []
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                     initargs=(algorithm, postprocess)) as executor:
+                for row in executor.map(_evaluate_pair, pairs, chunksize=chunksize):
+                    if row is None:
+                        continue
+                    row["algorithm"] = name
+                    rows.append({metric: row[metric] for metric in SUMMARY_METRICS + ("time",)})
+                    if writer is not None:
+                        writer.writerow(row)
+            summaries[name] = summarize(rows)
+            summaries[name]["elapsed"] = time.perf_counter() - start
+    finally:
+        if report is not None:
+            report.close()
+    return summaries
+
+def main():
+    parser = argparse.ArgumentParser(description="在带真值掩码的数据集上批量评估分割质量 (Dice/IoU/Hausdorff)")
+    parser.add_argument("truth_dir", help="真值掩码目录")
+    parser.add_argument("--images", help="原始图像目录，与--algorithms一起使用")
+    parser.add_argument("--algorithms", nargs="+", default=[], choices=sorted(segmentation_algorithms()),
+                        help="在原始图像上运行并评估的分割算法")
+    parser.add_argument("--predictions", nargs="+", default=[], metavar="名称=目录",
+                        help="已保存的分割结果目录")
+    parser.add_argument("--output", default=None, help="逐幅结果的CSV路径")
+    parser.add_argument("--mask-suffix", default="", help="真值文件名相对图像文件名多出的后缀，如_mask")
+    parser.add_argument("--postprocess", action="store_true", help="计算指标前做分割后处理")
+    parser.add_argument("--workers", type=int, default=None, help="进程数")
+    args = parser.parse_args()
+    
+    if args.algorithms and not args.images:
+        parser.error("--algorithms需要同时指定--images")
+    sources = [(algorithm, args.images, algorithm) for algorithm in args.algorithms]
+    for item in args.predictions:
+        name, sep, directory = item.partition("=")
+        if not sep:
+            name, directory = os.path.basename(os.path.normpath(item)), item
+        sources.append((name, directory, None))
+    if not sources:
+        parser.error("需要指定--algorithms或--predictions")
+    
+    summaries = evaluate(args.truth_dir, sources, args.output, args.mask_suffix, args.postprocess, args.workers)
+    print(f"{'算法':<16}{'图像数':>6}{'Dice':>16}{'IoU':>16}{'Hausdorff':>18}{'HD95':>10}{'失败':>6}{'ms/幅':>8}")
+    for name, s in summaries.items():
+        print(f"{name:<18}{s['count']:>6}{s['dice_mean']:>10.4f}±{s['dice_std']:<6.4f}{s['iou_mean']:>9.4f}±{s['iou_std']:<6.4f}"
+              f"{s['hausdorff_mean']:>10.1f}±{s['hausdorff_std']:<7.1f}{s['hausdorff95_mean']:>10.1f}{s['failed']:>7}"
+              f"{s['time'] * 1000:>9.1f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
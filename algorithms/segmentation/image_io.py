@@ -0,0 +1,30 @@
+import os
+
+import cv2
+
+# 批处理工具 (量化校准、分割评估、形态测量) 读取的图像格式
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff")
+
+def is_image_file(name):
+    """
+    按扩展名判断文件是否为支持的图像 (不区分大小写)
+    """
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+def load_images(image_dir, max_images=None):
+    """
+    读取目录中的图像 (灰度)，按文件名排序
+    
+    参数:
+        image_dir: 图像目录
+        max_images: 最多读取的图像数，为None时读取全部
+    
+    返回:
+        (文件名列表, 灰度图像列表)，无法读取的文件被跳过
+    """
+    names = sorted(f for f in os.listdir(image_dir) if is_image_file(f))
+    if max_images is not None:
+        names = names[:max_images]
+    images = [cv2.imread(os.path.join(image_dir, name), cv2.IMREAD_GRAYSCALE) for name in names]
+    kept = [(name, image) for name, image in zip(names, images) if image is not None]
+    return [name for name, _ in kept], [image for _, image in kept]
\ No newline at end of file
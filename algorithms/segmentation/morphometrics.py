@@ -0,0 +1,222 @@
+import argparse
+import csv
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from algorithms.segmentation.evaluation import segmentation_algorithms
+from algorithms.segmentation.image_io import is_image_file
+from algorithms.segmentation.postprocessing import MaskPostprocessing
+
+# 报表的列，按输出顺序；面积单位为像素或平方毫米，长度单位为像素或毫米 (由pixel_spacing决定)
+FIELDS = ("file", "width", "height", "components", "lung_area", "right_lung_area", "left_lung_area",
+          "left_right_ratio",
+          "right_x", "right_y", "right_w", "right_h", "left_x", "left_y", "left_w", "left_h",
+          "right_centroid_x", "right_centroid_y", "left_centroid_x", "left_centroid_y",
+          "right_orientation", "left_orientation", "right_eccentricity", "left_eccentricity",
+          "thoracic_width", "cardiac_width", "ctr", "time")
+
+class LungMorphometrics:
+    """
+    肺部形态测量
+    由分割结果计算肺面积、左右肺面积比、外接矩形、质心、主轴方向和心胸比估计。
+    连通域的面积和外接矩形直接取自connectedComponentsWithStats的统计表，
+    方向和偏心率由矩计算，心胸比由两肺内侧边缘的逐行位置向量化得到，不逐个轮廓或逐行循环。
+    """
+    
+    def __init__(self):
+        # 最近一次测量的耗时 (秒)
+        self.last_time = 0.0
+    
+    def measure(self, segmented, pixel_spacing=1.0):
+        """
+        测量一幅分割结果
+        
+        面积最大的两个连通域视为两肺，按影像惯例图像左侧为右肺、右侧为左肺。
+        胸廓宽度取两肺最外侧边缘的距离；心脏宽度取两肺下半部分中，同一行两肺内侧边缘间距
+        (纵隔宽度) 的最大值，心胸比为两者之比。只找到一个连通域时，比值相关的字段为nan。
+        
+        参数:
+            segmented: 任一分割算法的输出或二值掩码，非零像素视为前景
+            pixel_spacing: 像素间距 (毫米)，为1时以像素为单位
+        
+        返回:
+            字典，键见FIELDS (不含file和time)
+        """
+        start = time.perf_counter()
+        if len(segmented.shape) > 2:
+            segmented = cv2.cvtColor(segmented, cv2.COLOR_BGR2GRAY)
+        mask = cv2.compare(segmented, 0, cv2.CMP_GT)
+        height, width = mask.shape
+        count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        
+        # 面积最大的两个连通域，按质心横坐标从左到右排列
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        lungs = np.argsort(-areas, kind="stable")[:2] + 1
+        lungs = lungs[np.argsort(centroids[lungs, 0])]
+        
+        result = dict.fromkeys(FIELDS[1:-1], math.nan)
+        result.update(width=width, height=height, components=count - 1,
+                      lung_area=int(stats[lungs, cv2.CC_STAT_AREA].sum()) * pixel_spacing ** 2)
+        
+        if len(lungs) == 2:
+            sides = ("right", "left")
+        elif len(lungs) == 1:
+            # 只有一个连通域时按其在图像中的位置判断是哪一侧
+            sides = ("right",) if centroids[lungs[0], 0] < width / 2 else ("left",)
+        else:
+            sides = ()
+        for side, label in zip(sides, lungs):
+            x, y, w, h, area = stats[label]
+            result.update({f"{side}_lung_area": int(area) * pixel_spacing ** 2,
+                           f"{side}_x": int(x), f"{side}_y": int(y), f"{side}_w": int(w), f"{side}_h": int(h),
+                           f"{side}_centroid_x": float(centroids[label, 0]),
+                           f"{side}_centroid_y": float(centroids[label, 1])})
+            orientation, eccentricity = self._shape(labels[y:y + h, x:x + w] == label)
+            result[f"{side}_orientation"] = orientation
+            result[f"{side}_eccentricity"] = eccentricity
+        
+        if len(lungs) == 2:
+            result["left_right_ratio"] = result["left_lung_area"] / result["right_lung_area"]
+            right, left = stats[lungs]
+            outer = left[cv2.CC_STAT_LEFT] + left[cv2.CC_STAT_WIDTH] - right[cv2.CC_STAT_LEFT]
+            cardiac = self._mediastinum_width(labels, lungs, stats)
+            result["thoracic_width"] = float(outer) * pixel_spacing
+            result["cardiac_width"] = float(cardiac) * pixel_spacing
+            result["ctr"] = float(cardiac) / float(outer)
+        
+        self.last_time = time.perf_counter() - start
+        return result
+    
+    def _shape(self, region):
+        """
+        由二阶中心矩计算连通域的主轴方向 (度，相对水平方向) 和等效椭圆的偏心率
+        """
+        moments = cv2.moments(region.view(np.uint8), binaryImage=True)
+        mu20, mu02, mu11 = moments["mu20"], moments["mu02"], moments["mu11"]
+        orientation = 0.5 * math.degrees(math.atan2(2 * mu11, mu20 - mu02))
+        spread = math.sqrt(4 * mu11 ** 2 + (mu20 - mu02) ** 2)
+        major = (mu20 + mu02 + spread) / 2
+        minor = (mu20 + mu02 - spread) / 2
+        eccentricity = math.sqrt(max(1 - minor / major, 0.0)) if major > 0 else 0.0
+        return orientation, eccentricity
+    
+    def _mediastinum_width(self, labels, lungs, stats):
+        """
+        两肺下半部分中，同一行右肺 (图像左侧) 最右像素与左肺最左像素间距的最大值
+        两肺都有像素的行才参与计算，没有这样的行时返回0
+        """
+        right, left = lungs
+        top = min(stats[right, cv2.CC_STAT_TOP], stats[left, cv2.CC_STAT_TOP])
+        bottom = max(stats[right, cv2.CC_STAT_TOP] + stats[right, cv2.CC_STAT_HEIGHT],
+                     stats[left, cv2.CC_STAT_TOP] + stats[left, cv2.CC_STAT_HEIGHT])
+        # 心影位于肺野下半部分
+        rows = slice((top + bottom) // 2, bottom)
+        x0 = stats[right, cv2.CC_STAT_LEFT]
+        x1 = stats[left, cv2.CC_STAT_LEFT] + stats[left, cv2.CC_STAT_WIDTH]
+        region = labels[rows, x0:x1]
+        
+        in_right = region == right
+        in_left = region == left
+        both = in_right.any(axis=1) & in_left.any(axis=1)
+        if not both.any():
+            return 0
+        # 每行右肺的最后一个像素和左肺的第一个像素
+        right_edge = region.shape[1] - 1 - np.argmax(in_right[:, ::-1], axis=1)
+        left_edge = np.argmax(in_left, axis=1)
+        gap = (left_edge - right_edge - 1)[both]
+        return max(int(gap.max()), 0)
+
+def measure_directory(input_dir, output_path, algorithm=None, postprocess=False, pixel_spacing=1.0, workers=None):
+    """
+    测量目录中的所有图像并写出一张报表
+    
+    参数:
+        input_dir: 图像目录；algorithm为None时其中应为分割结果 (如主窗口保存的分割图像)
+        output_path: 报表路径，扩展名为.parquet时写Parquet (需要pandas和pyarrow)，否则写CSV
+        algorithm: 先对图像运行的分割算法名 (见evaluation.segmentation_algorithms)，为None时直接测量
+        postprocess: 测量前是否做分割后处理 (保留两个最大连通域并填充孔洞)
+        pixel_spacing: 像素间距 (毫米)
+        workers: 并行线程数，为None时使用CPU核数；OpenCV的函数会释放GIL，读取和测量可以并行
+    
+    返回:
+        报表的行 (字典列表)，按文件名排序
+    """
+    names = sorted(f for f in os.listdir(input_dir) if is_image_file(f))
+    segment = None
+    if algorithm is not None:
+        algorithm_class, run_algorithm = segmentation_algorithms()[algorithm]
+        if algorithm == "unet":
+            # U-Net的模型会话在实例间共享，cv2.dnn的网络不能被多个线程同时调用
+            workers = 1
+        segment = (algorithm_class, run_algorithm)
+    
+    # 分割算法和测量类都记录最近一次运行的状态，每个线程使用自己的实例
+    local = threading.local()
+    
+    def run(name):
+        if not hasattr(local, "morphometrics"):
+            local.morphometrics = LungMorphometrics()
+            local.postprocessing = MaskPostprocessing()
+            local.algorithm = segment[0]() if segment is not None else None
+        start = time.perf_counter()
+        image = cv2.imread(os.path.join(input_dir, name), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return None
+        segmented = image
+        if local.algorithm is not None:
+            segmented = segment[1](local.algorithm, image)
+        if postprocess:
+            segmented = local.postprocessing.process(image, segmented)
+        row = {"file": name}
+        row.update(local.morphometrics.measure(segmented, pixel_spacing))
+        row["time"] = time.perf_counter() - start
+        return row
+    
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        rows = [row for row in executor.map(run, names) if row is not None]
+    write_report(rows, output_path)
+    return rows
+
+def write_report(rows, output_path):
+    """
+    写出报表，扩展名为.parquet时写Parquet，否则写CSV
+    """
+    if output_path.lower().endswith(".parquet"):
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError("写出Parquet报表需要pandas和pyarrow包，请先运行 pip install pandas pyarrow")
+        pandas.DataFrame(rows, columns=FIELDS).to_parquet(output_path, index=False)
+        return
+    with open(output_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="批量测量肺部形态指标并写出报表")
+    parser.add_argument("input_dir", help="分割结果目录，或与--algorithm一起使用时的原始图像目录")
+    parser.add_argument("output", help="报表路径 (.csv或.parquet)")
+    parser.add_argument("--algorithm", choices=sorted(segmentation_algorithms()), default=None,
+                        help="先用该分割算法处理原始图像再测量")
+    parser.add_argument("--postprocess", action="store_true", help="测量前做分割后处理")
+    parser.add_argument("--pixel-spacing", type=float, default=1.0, help="像素间距 (毫米)")
+    parser.add_argument("--workers", type=int, default=None, help="并行线程数")
+    args = parser.parse_args()
+    
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"目录不存在: {args.input_dir}")
+    start = time.perf_counter()
+    rows = measure_directory(args.input_dir, args.output, args.algorithm, args.postprocess,
+                             args.pixel_spacing, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"测量{len(rows)}幅图像，耗时{elapsed:.2f}s ({len(rows) / max(elapsed, 1e-9):.1f}幅/秒)，报表已保存到 {args.output}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
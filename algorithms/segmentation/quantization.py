@@ -0,0 +1,222 @@
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from algorithms.segmentation.image_io import load_images
+from algorithms.segmentation.unet import MODEL_DIR, MODEL_FILES, PRECISIONS, UNet, get_session, int8_path
+
+# 需要量化权重和输入激活的算子，值为权重的输出通道轴
+QUANTIZED_OPS = {"Conv": 0, "ConvTranspose": 1}
+
+def _require_onnx():
+    """
+    导入onnx包 (只有校准和量化需要，不是运行软件的必需依赖)
+    """
+    try:
+        import onnx
+    except ImportError:
+        raise ImportError("U-Net模型量化需要onnx包，请先运行 pip install onnx")
+    return onnx
+
+def calibrate(model_path, images, input_size=256):
+    """
+    统计量化算子各输入激活在校准图像上的取值范围
+    
+    将这些中间张量追加为模型输出后用cv2.dnn逐幅前向传播，记录每个张量的最小值和最大值
+    
+    参数:
+        model_path: FP32 ONNX模型路径
+        images: 校准图像列表 (灰度)
+        input_size: 模型输入边长
+    
+    返回:
+        字典 {张量名: (最小值, 最大值)}
+    """
+    onnx = _require_onnx()
+    if not images:
+        raise ValueError("校准图像为空")
+    
+    model = onnx.load(model_path)
+    names = list(dict.fromkeys(node.input[0] for node in model.graph.node if node.op_type in QUANTIZED_OPS))
+    outputs = {output.name for output in model.graph.output}
+    for name in names:
+        if name not in outputs:
+            # cv2.dnn要求输出张量带有形状信息，使用符号维度
+            model.graph.output.append(
+                onnx.helper.make_tensor_value_info(name, onnx.TensorProto.FLOAT, ["n", "c", "h", "w"]))
+    net = cv2.dnn.readNetFromONNX(np.frombuffer(model.SerializeToString(), dtype=np.uint8))
+    out_names = list(net.getUnconnectedOutLayersNames())
+    
+    ranges = {name: (np.inf, -np.inf) for name in names}
+    for image in images:
+        net.setInput(cv2.dnn.blobFromImage(image, scalefactor=1.0 / 255, size=(input_size, input_size)))
+        values = dict(zip(out_names, net.forward(out_names)))
+        for name in names:
+            low, high = ranges[name]
+            ranges[name] = (min(low, float(values[name].min())), max(high, float(values[name].max())))
+    return ranges
+
+def quantize_model(model_path, output_path, ranges):
+    """
+    生成INT8静态量化模型 (QDQ格式)
+    
+    卷积权重按输出通道对称量化为int8，卷积输入激活按校准范围非对称量化为uint8；
+    量化参数以QuantizeLinear/DequantizeLinear节点写入，其余算子保持FP32。
+    支持INT8算子的推理后端 (如ONNX Runtime、OpenVINO) 会将QDQ节点与卷积融合为整数运算。
+    
+    参数:
+        model_path: FP32 ONNX模型路径
+        output_path: 量化模型输出路径
+        ranges: calibrate返回的激活取值范围
+    
+    返回:
+        量化的卷积层数
+    """
+    onnx = _require_onnx()
+    from onnx import helper, numpy_helper
+    
+    model = onnx.load(model_path)
+    graph = model.graph
+    weights = {init.name: init for init in graph.initializer}
+    replaced = set()
+    added = []
+    nodes = []
+    dequantized = {}
+    count = 0
+    
+    for node in graph.node:
+        axis = QUANTIZED_OPS.get(node.op_type)
+        if axis is None or node.input[0] not in ranges or node.input[1] not in weights:
+            nodes.append(node)
+            continue
+        
+        # 输入激活：uint8非对称量化，范围必须包含0，同一张量只插入一次
+        x = node.input[0]
+        if x not in dequantized:
+            low, high = ranges[x]
+            low, high = min(low, 0.0), max(high, 0.0)
+            scale = np.float32(max(high - low, 1e-8) / 255)
+            zero_point = np.uint8(np.clip(np.round(-low / scale), 0, 255))
+            added += [numpy_helper.from_array(np.array(scale), x + "_scale"),
+                      numpy_helper.from_array(np.array(zero_point), x + "_zero_point")]
+            nodes += [helper.make_node("QuantizeLinear", [x, x + "_scale", x + "_zero_point"], [x + "_quantized"]),
+                      helper.make_node("DequantizeLinear", [x + "_quantized", x + "_scale", x + "_zero_point"],
+                                       [x + "_dequantized"])]
+            dequantized[x] = x + "_dequantized"
+        
+        # 权重：按输出通道int8对称量化
+        w = node.input[1]
+        if w not in replaced:
+            array = numpy_helper.to_array(weights[w])
+            channels = np.moveaxis(array, axis, 0).reshape(array.shape[axis], -1)
+            scale = (np.maximum(np.abs(channels).max(axis=1), 1e-8) / 127).astype(np.float32)
+            shape = [1] * array.ndim
+            shape[axis] = -1
+            quantized = np.clip(np.round(array / scale.reshape(shape)), -127, 127).astype(np.int8)
+            added += [numpy_helper.from_array(quantized, w + "_quantized"),
+                      numpy_helper.from_array(scale, w + "_scale"),
+                      numpy_helper.from_array(np.zeros(scale.size, dtype=np.int8), w + "_zero_point")]
+            nodes.append(helper.make_node("DequantizeLinear", [w + "_quantized", w + "_scale", w + "_zero_point"],
+                                          [w + "_dequantized"], axis=axis))
+            replaced.add(w)
+        
+        quantized_node = helper.make_node(node.op_type, [dequantized[x], w + "_dequantized"] + list(node.input[2:]),
+                                          list(node.output), name=node.name)
+        quantized_node.attribute.extend(node.attribute)
+        nodes.append(quantized_node)
+        count += 1
+    
+    del graph.node[:]
+    graph.node.extend(nodes)
+    kept = [init for init in graph.initializer if init.name not in replaced]
+    del graph.initializer[:]
+    graph.initializer.extend(kept + added)
+    # QuantizeLinear的按通道量化需要opset 13
+    for opset in model.opset_import:
+        if opset.domain in ("", "ai.onnx") and opset.version < 13:
+            opset.version = 13
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+    return count
+
+def compare_precisions(images, model_type=0, precisions=PRECISIONS, confidence=0.5, repeats=3):
+    """
+    对比各推理精度与FP32的延迟和掩码一致性
+    
+    参数:
+        images: 测试图像列表 (灰度)
+        model_type: 模型类型 (0: 预训练, 1: 自定义)
+        precisions: 参与对比的精度
+        confidence: 置信度阈值
+        repeats: 每幅图像重复推理的次数，取中位数作为延迟
+    
+    返回:
+        每种精度一个字典: precision、latency (每幅图像的中位延迟，秒)、dice、iou (与FP32掩码的平均值)、
+        max_diff (前景概率的最大绝对差)；该精度的模型不存在时不包含在结果中
+    """
+    path = os.path.join(MODEL_DIR, MODEL_FILES[model_type])
+    reference = None
+    report = []
+    for precision in ("fp32",) + tuple(p for p in precisions if p != "fp32"):
+        if get_session(path, UNet.INPUT_SIZE, precision) is None:
+            continue
+        unet = UNet()
+        unet.load_model(model_type, precision)
+        times = []
+        probabilities = []
+        for image in images:
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                probability = unet.predict_batch([image], model_type, precision)[0]
+                samples.append(time.perf_counter() - start)
+            times.append(np.median(samples))
+            probabilities.append(probability)
+        if reference is None:
+            reference = probabilities
+        
+        dice, iou, max_diff = [], [], 0.0
+        for probability, expected in zip(probabilities, reference):
+            mask = probability >= confidence
+            expected_mask = expected >= confidence
+            intersection = np.count_nonzero(mask & expected_mask)
+            total = np.count_nonzero(mask) + np.count_nonzero(expected_mask)
+            dice.append(2 * intersection / total if total else 1.0)
+            iou.append(intersection / (total - intersection) if total else 1.0)
+            max_diff = max(max_diff, float(np.abs(probability - expected).max()))
+        
+        if precision in precisions:
+            report.append({"precision": precision, "latency": float(np.median(times)),
+                           "dice": float(np.mean(dice)), "iou": float(np.mean(iou)), "max_diff": max_diff})
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="U-Net模型INT8校准量化及各推理精度对比")
+    parser.add_argument("image_dir", help="校准图像目录，如x-ray")
+    parser.add_argument("--model-type", type=int, default=0, choices=sorted(MODEL_FILES), help="0: 预训练模型, 1: 自定义训练")
+    parser.add_argument("--max-images", type=int, default=None, help="最多使用的校准图像数")
+    parser.add_argument("--confidence", type=float, default=0.5, help="计算掩码一致性的置信度阈值")
+    args = parser.parse_args()
+    
+    path = os.path.join(MODEL_DIR, MODEL_FILES[args.model_type])
+    if not os.path.isfile(path):
+        parser.error(f"模型文件不存在: {path}")
+    names, images = load_images(args.image_dir, args.max_images)
+    if not images:
+        parser.error(f"目录中没有图像: {args.image_dir}")
+    
+    ranges = calibrate(path, images, UNet.INPUT_SIZE)
+    count = quantize_model(path, int8_path(path), ranges)
+    print(f"使用{len(images)}幅图像校准，量化{count}个卷积层，已保存到 {int8_path(path)}")
+    
+    print(f"{'精度':<6}{'延迟(ms)':>10}{'加速比':>8}{'Dice':>8}{'IoU':>8}{'最大概率差':>12}")
+    report = compare_precisions(images, args.model_type, confidence=args.confidence)
+    for row in report:
+        print(f"{row['precision']:<8}{row['latency'] * 1000:>10.1f}{report[0]['latency'] / row['latency']:>9.2f}"
+              f"{row['dice']:>9.4f}{row['iou']:>8.4f}{row['max_diff']:>13.4f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,6 +1,9 @@
 import cv2
 import numpy as np
 from queue import Queue
+from skimage.morphology import reconstruction
+
+from algorithms.image_cache import ImageCache, image_key
 
 class RegionGrowing:
     """
@@ -9,9 +12,10 @@ class RegionGrowing:
     """
     
     def __init__(self):
-        pass
+        # 到达阈值图缓存，键为(图像内容, 种子点)
+        self._arrival_cache = ImageCache(max_entries=8, max_bytes=64 * 1024 * 1024)
     
-    def process(self, image, seed_point=(0, 0), threshold=10, **kwargs):
+    def process(self, image, seed_point=(0, 0), threshold=10, method="flood", **kwargs):
         """
         应用区域生长分割
         
@@ -19,6 +23,10 @@ class RegionGrowing:
             image: 输入图像 (灰度或彩色)
             seed_point: 种子点坐标 (x, y)
             threshold: 区域生长阈值
+            method: 生长引擎
+                "flood": OpenCV扫描线填充 (默认，原生实现)
+                "tree": 预计算种子的到达阈值图，同一图像和种子下任意阈值只需一次比较
+                "bfs": 原始的Python队列广度优先搜索 (用于等价性验证)
         
         返回:
             分割后的图像
@@ -29,6 +37,226 @@ class RegionGrowing:
         else:
             gray = image.copy()
         
+        if method == "bfs":
+            mask = self._grow_bfs(gray, seed_point, threshold)
+        elif method == "flood":
+            mask = self._grow_flood(gray, seed_point, threshold)
+        elif method == "tree":
+            mask = cv2.compare(self.arrival_map(gray, seed_point), threshold, cv2.CMP_LE)
+        else:
+            raise ValueError(f"未知的区域生长引擎: {method}")
+        
+        # 应用掩码到原始图像
+        segmented = cv2.bitwise_and(gray, gray, mask=mask)
+        
+        return segmented
+    
+    def arrival_map(self, gray, seed_point):
+        """
+        计算种子点的到达阈值图 (最小-最大路径代价)
+        
+        A(p) 为从种子到p的所有4连通路径中，路径上 |I - I(seed)| 最大值的最小值，
+        因此阈值t下的生长区域恰好是 A <= t。
+        通过以种子为标记、以 255 - |I - I(seed)| 为掩模的灰度形态学重建一次求出，
+        结果按图像内容和种子点缓存。
+        
+        参数:
+            gray: 8位灰度图像
+            seed_point: 种子点坐标 (x, y)
+        
+        返回:
+            uint8到达阈值图
+        """
+        x, y = int(seed_point[0]), int(seed_point[1])
+        key = (image_key(gray), x, y)
+        arrival = self._arrival_cache.get(key)
+        if arrival is not None:
+            return arrival
+        
+        # 与种子的接近程度，越大越接近，种子处为255
+        closeness = 255 - cv2.absdiff(gray, np.full_like(gray, gray[y, x]))
+        marker = np.zeros_like(closeness)
+        marker[y, x] = closeness[y, x]
+        
+        # 重建结果为种子到各点路径上最小接近程度的最大值 (4连通)
+        cross = np.array([[0, 1, 0], [1, 1, 1], [0, 1, 0]], dtype=np.uint8)
+        reconstructed = reconstruction(marker, closeness, 'dilation', cross)
+        arrival = 255 - reconstructed.astype(np.uint8)
+        
+        self._arrival_cache.put(key, arrival)
+        return arrival
+    
+    def process_multi(self, image, seeds, thresholds=10, exclusion_seeds=(), exclusion_thresholds=10, **kwargs):
+        """
+        多种子、多标签区域生长
+        所有种子的生长前沿在同一个按优先级分桶的队列中竞争，每个前沿只进入自己的种子接受的像素，
+        优先级为像素灰度与该种子的归一化差异 (|I - I(seed)| / 阈值，量化为256级)。
+        像素归先到达的前沿所有，一个种子接受而另一个不接受的像素不会被后者占据。
+        竞争中一个种子占据的瓶颈像素 (如窄阈值种子所在的通道) 会挡住其后只有另一个种子接受的像素，
+        因此竞争结束后再做一遍补充：仍未被占据、但在某个种子单独生长区域内的像素归该种子
+        (多个种子都能到达时归归一化差异最小者)。补充的像素与种子之间可能隔着其他标签的区域，
+        但前景总是等于各种子单独生长区域的并集，竞争只划分区域而不会丢失区域。
+        
+        参数:
+            image: 输入图像 (灰度或彩色，8位)
+            seeds: 种子点坐标列表 [(x, y), ...]，第i个种子对应标签i+1
+            thresholds: 生长阈值，标量或与seeds等长的列表
+            exclusion_seeds: 排除种子列表 (如心脏、纵隔)，参与竞争但结果中置为背景
+            exclusion_thresholds: 排除种子的生长阈值，标量或与exclusion_seeds等长的列表
+        
+        返回:
+            int32标签图，0为背景，1..len(seeds)为各种子的区域
+        """
+        # 确保图像是灰度图
+        if len(image.shape) > 2:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+        
+        h, w = gray.shape
+        all_seeds = list(seeds) + list(exclusion_seeds)
+        n_keep = len(seeds)
+        if not all_seeds:
+            return np.zeros((h, w), dtype=np.int32)
+        
+        # 每个种子的阈值
+        th = np.concatenate([
+            np.broadcast_to(np.asarray(thresholds, dtype=np.float64), (len(seeds),)),
+            np.broadcast_to(np.asarray(exclusion_thresholds, dtype=np.float64), (len(exclusion_seeds),))
+        ])
+        xs = np.array([int(s[0]) for s in all_seeds])
+        ys = np.array([int(s[1]) for s in all_seeds])
+        seed_values = gray[ys, xs].astype(np.float64)
+        
+        # 每个标签对每个灰度级的优先级 ((K+1) x 256)：归一化差异量化为0~255，种子不接受的灰度为256；
+        # 第0行对应背景，不接受任何灰度
+        levels = np.arange(256, dtype=np.float64)
+        dist_table = np.abs(levels[None, :] - seed_values[:, None]) / np.maximum(th[:, None], 1e-6)
+        priority = np.where(dist_table <= 1.0, np.rint(dist_table * 255), 256).astype(np.uint16)
+        priority = np.vstack([np.full((1, 256), 256, dtype=np.uint16), priority])
+        
+        labels = np.zeros((h, w), dtype=np.int32)
+        if len(all_seeds) == 1:
+            # 没有竞争时与单种子生长相同，直接用floodFill
+            labels[self._grow_flood(gray, (xs[0], ys[0]), th[0]) > 0] = 1
+        else:
+            labels[ys, xs] = np.arange(1, len(all_seeds) + 1, dtype=np.int32)
+            self._flood_labels(gray, labels, priority, np.ravel_multi_index((ys, xs), (h, w)))
+            self._fill_blocked(gray, labels, xs, ys, th, dist_table)
+        
+        # 排除种子的区域置为背景
+        labels[labels > n_keep] = 0
+        
+        return labels
+    
+    def _flood_labels(self, gray, labels, priority, seeds):
+        """
+        按优先级分桶的多标签泛洪，结果原地写入labels (0为尚未到达)
+        
+        水位为level时，前沿的4邻点中优先级不超过level的立即被该前沿占据并继续扩展，
+        其余被接受的邻点连同来源标签放入其优先级对应的桶，水位升到该值时若仍未被占据再扩展。
+        同一像素可能被不同标签以不同优先级放入多个桶，占据时以先到者为准。
+        """
+        height, width = labels.shape
+        size = height * width
+        flat = labels.reshape(-1)
+        values = gray.reshape(-1)
+        offsets = np.array([-width, width, -1, 1], dtype=np.intp)
+        buckets = [[] for _ in range(256)]
+        # 本级水位下到达、优先级高于水位的 (像素, 标签, 优先级)，进入下一级前一次性分桶
+        waiting = []
+        frontier = np.asarray(seeds, dtype=np.intp)
+        
+        for level in range(256):
+            if waiting:
+                pixels = np.concatenate([p for p, _, _ in waiting])
+                sources = np.concatenate([s for _, s, _ in waiting])
+                ranks = np.concatenate([r for _, _, r in waiting])
+                waiting = []
+                order = np.argsort(ranks, kind="stable")
+                pixels, sources, ranks = pixels[order], sources[order], ranks[order]
+                counts = np.bincount(ranks, minlength=256)
+                ends = np.cumsum(counts)
+                for rank in np.flatnonzero(counts):
+                    part = slice(ends[rank] - counts[rank], ends[rank])
+                    buckets[rank].append((pixels[part], sources[part]))
+            if buckets[level]:
+                pixels = np.concatenate([p for p, _ in buckets[level]])
+                sources = np.concatenate([s for _, s in buckets[level]])
+                buckets[level] = None
+                frontier = np.concatenate([frontier, self._claim(flat, pixels, sources)])
+            
+            while frontier.size:
+                # 前沿的4邻点，图像外的邻点 (及左右越界换行后的邻点) 换成像素自身，它已被占据，随后被过滤掉
+                neighbors = frontier[:, None] + offsets
+                column = frontier % width
+                for direction, outside in enumerate((frontier < width, frontier >= size - width,
+                                                     column == 0, column == width - 1)):
+                    np.copyto(neighbors[:, direction], frontier, where=outside)
+                neighbors = neighbors.ravel()
+                sources = np.repeat(flat[frontier], 4)
+                free = flat[neighbors] == 0
+                neighbors = neighbors[free]
+                sources = sources[free]
+                
+                ranks = priority[sources, values[neighbors]]
+                now = ranks <= level
+                frontier = self._claim(flat, neighbors[now], sources[now])
+                later = ~now & (ranks < 256)
+                if later.any():
+                    waiting.append((neighbors[later], sources[later], ranks[later]))
+    
+    def _fill_blocked(self, gray, labels, xs, ys, thresholds, dist_table):
+        """
+        竞争之后的补充：仍为0、但在某个种子单独生长 (floodFill) 区域内的像素归该种子，
+        多个种子都能到达的像素归归一化差异最小者，结果原地写入labels
+        """
+        unclaimed = labels == 0
+        best = np.full(labels.shape, np.inf)
+        for k, (x, y, threshold) in enumerate(zip(xs, ys, thresholds)):
+            pixels = np.flatnonzero(unclaimed & (self._grow_flood(gray, (x, y), threshold) > 0))
+            if pixels.size == 0:
+                continue
+            dist = dist_table[k, gray.reshape(-1)[pixels]]
+            closer = dist < best.reshape(-1)[pixels]
+            best.reshape(-1)[pixels[closer]] = dist[closer]
+            labels.reshape(-1)[pixels[closer]] = k + 1
+    
+    def _claim(self, flat, pixels, sources):
+        """
+        把尚未到达的像素分给对应的来源标签，同一像素出现多次时只保留一个，返回被占据的像素
+        """
+        free = flat[pixels] == 0
+        pixels = pixels[free]
+        sources = sources[free]
+        # 去重：先写入各自的负序号，读回仍是自己序号的才保留
+        stamps = -np.arange(1, pixels.size + 1, dtype=flat.dtype)
+        flat[pixels] = stamps
+        unique = flat[pixels] == stamps
+        pixels = pixels[unique]
+        flat[pixels] = sources[unique]
+        return pixels
+    
+    def _grow_flood(self, gray, seed_point, threshold):
+        """
+        使用cv2.floodFill的固定范围模式生长区域
+        与种子点灰度差不超过threshold的4连通像素被填充，结果与BFS完全一致
+        """
+        h, w = gray.shape
+        # floodFill要求掩码比图像四周各大1个像素
+        flood_mask = np.zeros((h + 2, w + 2), dtype=np.uint8)
+        
+        # 4连通 + 固定范围(与种子点比较) + 只写掩码，掩码填充值为255
+        flags = 4 | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | (255 << 8)
+        cv2.floodFill(gray, flood_mask, tuple(int(v) for v in seed_point), 0,
+                      threshold, threshold, flags)
+        
+        return flood_mask[1:-1, 1:-1]
+    
+    def _grow_bfs(self, gray, seed_point, threshold):
+        """
+        使用队列的广度优先搜索生长区域 (原始实现)
+        """
         # 创建掩码
         h, w = gray.shape
         mask = np.zeros((h, w), dtype=np.uint8)
@@ -69,7 +297,4 @@ class RegionGrowing:
                     q.put((nx, ny))
                     visited.add((nx, ny))
         
-        # 应用掩码到原始图像
-        segmented = cv2.bitwise_and(gray, gray, mask=mask)
-        
-        return segmented
\ No newline at end of file
+        return mask
\ No newline at end of file
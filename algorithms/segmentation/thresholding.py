@@ -1,28 +1,213 @@
 import cv2
 import numpy as np
 
+class ThresholdHistogram:
+    """
+    基于直方图的阈值计算
+    每幅图像只统计一次256级直方图及其累积和，之后任意阈值下的前景像素数，
+    以及Otsu、多级Otsu、三角法、Li阈值都只在256个灰度级上计算，不再访问像素。
+    约定前景为灰度大于阈值的像素 (与cv2.THRESH_BINARY一致)。
+    """
+    
+    LEVELS = 256
+    
+    def __init__(self, gray):
+        """
+        参数:
+            gray: 8位灰度图像
+        """
+        self.hist = cv2.calcHist([gray], [0], None, [self.LEVELS], [0, self.LEVELS]).ravel().astype(np.float64)
+        self.levels = np.arange(self.LEVELS, dtype=np.float64)
+        # 灰度级0..t的像素数和灰度和
+        self.cum_count = np.cumsum(self.hist)
+        self.cum_sum = np.cumsum(self.hist * self.levels)
+        self.total = self.cum_count[-1]
+    
+    def foreground_counts(self):
+        """
+        返回每个阈值t (0..255) 下灰度大于t的像素数
+        """
+        return self.total - self.cum_count
+    
+    def foreground_count(self, threshold):
+        """
+        返回灰度大于threshold的像素数
+        """
+        t = int(np.floor(threshold))
+        if t < 0:
+            return int(self.total)
+        return int(self.total - self.cum_count[min(t, self.LEVELS - 1)])
+    
+    def otsu(self):
+        """
+        Otsu阈值：使两类的类间方差最大，结果与cv2.THRESH_OTSU相同
+        """
+        p = self.hist / self.total
+        q1 = np.cumsum(p)
+        q2 = 1 - q1
+        mu = float(np.dot(self.levels, p))
+        # 与OpenCV相同，任一类占比小于FLT_EPSILON的阈值不参与比较
+        eps = np.finfo(np.float32).eps
+        valid = (np.minimum(q1, q2) >= eps) & (np.maximum(q1, q2) <= 1 - eps)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mu1 = np.cumsum(self.levels * p) / q1
+            mu2 = (mu - q1 * mu1) / q2
+            sigma = q1 * q2 * (mu1 - mu2) ** 2
+        sigma = np.where(valid, sigma, 0)
+        # 取第一个最大值；类间方差全为0 (如只有一个灰度级) 时阈值为0
+        return int(np.argmax(sigma)) if sigma.max() > 0 else 0
+    
+    def multi_otsu(self, classes=3):
+        """
+        多级Otsu阈值：将灰度级划分为classes类，使类间方差最大
+        
+        类间方差等价于各类 (灰度和^2 / 像素数) 之和，按类数动态规划求解，
+        复杂度为 O(classes * 256^2)，与图像大小无关
+        
+        参数:
+            classes: 类别数 (>= 2)
+        
+        返回:
+            classes-1个递增的阈值，第k类为灰度在 (t[k-1], t[k]] 内的像素
+        """
+        if classes < 2:
+            raise ValueError("多级Otsu的类别数至少为2")
+        n = self.LEVELS
+        count = np.concatenate([[0.0], self.cum_count])
+        total = np.concatenate([[0.0], self.cum_sum])
+        # score[i, j]: 灰度级i..j-1组成一类时的 灰度和^2 / 像素数，空类为0
+        weight = count[None, :] - count[:, None]
+        moment = total[None, :] - total[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = np.where(weight > 0, moment * moment / weight, 0.0)
+        # 各类至少包含一个灰度级
+        score[np.tril_indices(n + 1)] = -np.inf
+        
+        # best[j]: 前j个灰度级分为k类的最大得分，split记录最后一类的起点
+        best = score[0].copy()
+        splits = []
+        for _ in range(classes - 1):
+            candidates = best[:, None] + score
+            split = np.argmax(candidates, axis=0)
+            best = candidates[split, np.arange(n + 1)]
+            splits.append(split)
+        
+        # 从最后一个灰度级回溯各类的起点
+        thresholds = []
+        end = n
+        for split in reversed(splits):
+            end = int(split[end])
+            thresholds.append(end - 1)
+        return thresholds[::-1]
+    
+    def triangle(self):
+        """
+        三角法阈值：直方图峰值与最远端连线的最远点，结果与cv2.THRESH_TRIANGLE相同
+        """
+        hist = self.hist
+        n = self.LEVELS
+        # 非零区间向两侧各扩展一个灰度级 (与OpenCV相同，右端只在1..255中查找)
+        nonzero = np.flatnonzero(hist)
+        left = max(int(nonzero[0]) - 1, 0) if nonzero.size else 0
+        right = int(nonzero[-1]) if nonzero.size else 0
+        right = min(right + 1, n - 1)
+        peak = int(np.argmax(hist))
+        
+        # 峰值偏左时翻转直方图，使长尾位于峰值左侧
+        flipped = peak - left < right - peak
+        if flipped:
+            hist = hist[::-1]
+            left = n - 1 - right
+            peak = n - 1 - peak
+        
+        # 到峰值与左端连线的 (未归一化) 距离，取第一个最大值
+        candidates = np.arange(left + 1, peak + 1)
+        distance = hist[peak] * candidates + (left - peak) * hist[candidates]
+        threshold = left
+        if candidates.size and distance.max() > 0:
+            threshold = int(candidates[np.argmax(distance)])
+        threshold -= 1
+        
+        return n - 1 - threshold if flipped else threshold
+    
+    def li(self, tolerance=0.5):
+        """
+        Li最小交叉熵阈值 (迭代法)，结果与skimage.filters.threshold_li相同
+        每次迭代的前景、背景均值由累积和直接得到
+        
+        参数:
+            tolerance: 相邻两次迭代的阈值之差小于该值时停止
+        
+        返回:
+            浮点阈值
+        """
+        nonzero = np.flatnonzero(self.hist)
+        low, high = int(nonzero[0]), int(nonzero[-1])
+        if low == high:
+            return float(low)
+        
+        # 灰度平移到从0开始，使对数有意义
+        shifted_sum = self.cum_sum - low * self.cum_count
+        t_next = shifted_sum[-1] / self.total
+        t_curr = -2 * tolerance
+        while abs(t_next - t_curr) > tolerance:
+            t_curr = t_next
+            t = min(int(np.floor(t_curr)) + low, high - 1)
+            mean_back = shifted_sum[t] / self.cum_count[t]
+            mean_fore = (shifted_sum[-1] - shifted_sum[t]) / (self.total - self.cum_count[t])
+            if mean_back == 0:
+                break
+            t_next = (mean_back - mean_fore) / (np.log(mean_back) - np.log(mean_fore))
+        return float(t_next + low)
+    
+    def threshold(self, method):
+        """
+        按名称计算自动阈值 ("otsu"、"triangle"、"li")
+        """
+        if method == "otsu":
+            return self.otsu()
+        if method == "triangle":
+            return self.triangle()
+        if method == "li":
+            return self.li()
+        raise ValueError(f"未知的自动阈值方法: {method}")
+
 class Thresholding:
     """
     阈值分割
     基于像素强度阈值将图像分割为前景和背景
     """
     
+    # 局部自适应阈值方法，阈值由以每个像素为中心的窗口内的均值和标准差计算
+    LOCAL_METHODS = ("adaptive_mean", "niblack", "sauvola")
+    
     def __init__(self):
-        pass
+        # 最近一次使用的阈值 (多级Otsu时为阈值列表)
+        self.last_threshold = None
     
-    def process(self, image, threshold=127, threshold_type=0, **kwargs):
+    def process(self, image, threshold=127, threshold_type=0, method="manual", classes=3,
+                window_size=51, k=0.2, offset=0, **kwargs):
         """
         应用阈值分割
         
         参数:
-            image: 输入图像 (灰度或彩色)
-            threshold: 阈值 (0-255)
+            image: 输入图像 (灰度或彩色；局部自适应方法也接受16位灰度图)
+            threshold: 阈值 (0-255)，method为"manual"时使用
             threshold_type: 阈值类型
                 0: 二值化 (THRESH_BINARY)
                 1: 反二值化 (THRESH_BINARY_INV)
                 2: 截断 (THRESH_TRUNC)
                 3: 阈值为零 (THRESH_TOZERO)
                 4: 反阈值为零 (THRESH_TOZERO_INV)
+            method: 阈值方法
+                "manual": 使用threshold参数
+                "otsu"、"triangle"、"li": 由直方图自动计算阈值
+                "multi_otsu": 多级Otsu，输出classes个等间隔灰度级的分类图 (忽略threshold_type)
+                "adaptive_mean"、"niblack"、"sauvola": 局部自适应阈值，见local_threshold
+            classes: 多级Otsu的类别数
+            window_size: 局部窗口边长 (奇数)
+            k: Niblack/Sauvola的标准差权重
+            offset: 局部均值阈值的偏移量，阈值为 窗口均值 - offset
         
         返回:
             分割后的图像
@@ -42,7 +227,104 @@ class Thresholding:
             cv2.THRESH_TOZERO_INV
         ]
         
+        if method == "multi_otsu":
+            # 只在最后查表时访问像素：第k类映射为灰度 k*255/(classes-1)
+            thresholds = ThresholdHistogram(gray).multi_otsu(classes)
+            classes_lut = np.searchsorted(thresholds, np.arange(ThresholdHistogram.LEVELS), side="left")
+            lut = np.uint8(np.round(classes_lut * 255.0 / (classes - 1)))
+            self.last_threshold = thresholds
+            return cv2.LUT(gray, lut)
+        if method in self.LOCAL_METHODS:
+            local = self.local_threshold(gray, method, window_size, k, offset)
+            self.last_threshold = None
+            return self._apply_local(gray, local, threshold_type)
+        if method != "manual":
+            threshold = ThresholdHistogram(gray).threshold(method)
+        self.last_threshold = threshold
+        
         # 应用阈值
         _, segmented = cv2.threshold(gray, threshold, 255, thresh_types[threshold_type])
         
-        return segmented
\ No newline at end of file
+        return segmented
+    
+    def local_threshold(self, gray, method="sauvola", window_size=51, k=0.2, offset=0):
+        """
+        计算逐像素的局部阈值图
+        
+        窗口均值m和标准差s由I和I^2的积分图得到，每个像素只需常数次加减，
+        耗时与窗口大小无关。图像边界按镜像方式延拓，与skimage的threshold_niblack/
+        threshold_sauvola一致。
+        
+        参数:
+            gray: 8位或16位灰度图像
+            method: "adaptive_mean" (m - offset)、"niblack" (m - k*s)、
+                    "sauvola" (m * (1 + k*(s/R - 1))，R为数据类型取值范围的一半)
+            window_size: 窗口边长，偶数时加1
+            k: 标准差权重
+            offset: 局部均值阈值的偏移量
+        
+        返回:
+            float64阈值图，前景为灰度大于阈值的像素
+        """
+        if gray.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"局部自适应阈值只支持8位或16位灰度图像: {gray.dtype}")
+        window_size = int(window_size) | 1
+        mean, std = self._local_mean_std(gray, window_size)
+        if method == "adaptive_mean":
+            mean -= offset
+            return mean
+        if method == "niblack":
+            std *= -k
+            mean += std
+            return mean
+        if method == "sauvola":
+            r = np.iinfo(gray.dtype).max / 2
+            std *= k / r
+            std += 1 - k
+            mean *= std
+            return mean
+        raise ValueError(f"未知的局部阈值方法: {method}")
+    
+    def _local_mean_std(self, gray, window_size):
+        """
+        由积分图计算以每个像素为中心、边长window_size的窗口内的均值和标准差
+        """
+        radius = window_size // 2
+        padded = cv2.copyMakeBorder(gray, radius, radius, radius, radius, cv2.BORDER_REFLECT_101)
+        # 8位图像的I^2积分不超过2^53，float64可精确表示；16位图像在大图上有相对1e-16量级的舍入
+        total, total_sq = cv2.integral2(padded, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+        h, w = gray.shape
+        n = window_size
+        
+        def box_sum(integral):
+            # 窗口 [y, y+n) x [x, x+n) 的和：四个角的加减，原地计算避免多余的整幅临时数组
+            result = integral[n:n + h, n:n + w].copy()
+            result -= integral[:h, n:n + w]
+            result -= integral[n:n + h, :w]
+            result += integral[:h, :w]
+            return result
+        
+        area = float(n * n)
+        mean = box_sum(total)
+        mean /= area
+        var = box_sum(total_sq)
+        var /= area
+        var -= mean * mean
+        np.maximum(var, 0, out=var)
+        return mean, np.sqrt(var, out=var)
+    
+    def _apply_local(self, gray, local, threshold_type):
+        """
+        按阈值类型将逐像素阈值应用到图像
+        二值化类型输出8位0/255掩码，截断和阈值为零类型保持输入的数据类型
+        """
+        above = gray > local
+        if threshold_type == 0:
+            return np.uint8(above) * 255
+        if threshold_type == 1:
+            return np.uint8(~above) * 255
+        if threshold_type == 2:
+            return np.where(above, local, gray).astype(gray.dtype)
+        if threshold_type == 3:
+            return np.where(above, gray, 0).astype(gray.dtype)
+        return np.where(above, 0, gray).astype(gray.dtype)
\ No newline at end of file
@@ -1,6 +1,95 @@
 import cv2
 import numpy as np
 import os
+import threading
+
+from algorithms.segmentation.postprocessing import MaskPostprocessing
+from algorithms.segmentation.thresholding import ThresholdHistogram
+
+# 模型文件目录 (项目根目录下的models)
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "models")
+
+# 各模型类型对应的ONNX文件
+MODEL_FILES = {
+    0: "unet_pretrained.onnx",
+    1: "unet_custom.onnx"
+}
+
+# 推理精度，"int8"使用校准工具生成的量化模型 (与原模型同目录，扩展名为.int8.onnx)
+PRECISIONS = ("fp32", "fp16", "int8")
+INT8_SUFFIX = ".int8.onnx"
+
+# 进程内共享的推理会话缓存，键为(模型绝对路径, 修改时间, 输入边长, 精度)，所有UNet实例共用
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+class InferenceSession:
+    """
+    cv2.dnn推理会话
+    模型输入为 N x 1 x size x size 的float32灰度图 (取值0~1)，
+    输出为 N x 1 x size x size 的前景概率 (或 N x 2 x size x size，取第1通道)
+    """
+    
+    def __init__(self, path, input_size=256, precision="fp32"):
+        self.path = path
+        self.input_size = input_size
+        self.precision = precision
+        self.net = cv2.dnn.readNetFromONNX(path)
+        if precision == "fp16":
+            # 只有CPU支持半精度运算时才生效 (如ARM)，否则OpenCV仍按FP32计算
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU_FP16)
+        # cv2.dnn的Net不能被多个线程同时使用
+        self._lock = threading.Lock()
+        # 预热：首次前向传播会完成内存分配和层初始化
+        self.forward(np.zeros((1, 1, input_size, input_size), dtype=np.float32))
+    
+    def forward(self, blob):
+        """
+        对 N x 1 x H x W 的输入做一次前向传播，返回 N x H x W 的前景概率
+        """
+        with self._lock:
+            self.net.setInput(blob)
+            output = self.net.forward()
+        if output.ndim == 4:
+            output = output[:, 1] if output.shape[1] == 2 else output[:, 0]
+        return output
+
+def int8_path(path):
+    """
+    返回模型对应的INT8量化模型路径
+    """
+    return os.path.splitext(path)[0] + INT8_SUFFIX
+
+def get_session(path, input_size=256, precision="fp32"):
+    """
+    获取模型的推理会话，同一模型文件只加载和预热一次；文件被替换(修改时间变化)后重新加载
+    
+    参数:
+        path: ONNX模型文件路径 (FP32原模型)
+        input_size: 模型输入边长
+        precision: 推理精度，"fp32"、"fp16"或"int8" (加载int8_path(path)处的量化模型)
+    
+    返回:
+        InferenceSession，文件不存在时返回None
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"未知的推理精度: {precision}")
+    if precision == "int8":
+        path = int8_path(path)
+    if not os.path.isfile(path):
+        return None
+    path = os.path.abspath(path)
+    mtime = os.path.getmtime(path)
+    key = (path, mtime, input_size, precision)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            # 丢弃同一文件的旧版本会话
+            for old in [k for k in _sessions if k[0] == path and k[1] != mtime]:
+                del _sessions[old]
+            session = InferenceSession(path, input_size, precision)
+            _sessions[key] = session
+        return session
 
 class UNet:
     """
@@ -8,21 +97,174 @@ class UNet:
     使用预训练的U-Net模型进行肺部分割
     """
     
+    # 模型输入边长
+    INPUT_SIZE = 256
+    
     def __init__(self):
-        # 模拟预训练模型
         self.model_loaded = False
+        self.model_type = None
+        self.precision = "fp32"
+        # 当前模型的推理会话，模型文件不存在时为None (使用模拟分割)
+        self.session = None
+        # 模拟分割使用的掩码后处理
+        self.postprocessing = MaskPostprocessing()
     
-    def load_model(self, model_type=0):
+    def load_model(self, model_type=0, precision="fp32"):
         """
-        加载模型 (模拟)
+        加载模型
+        从models目录加载ONNX模型并预热，会话在进程内共享；模型文件不存在时使用模拟分割
         
         参数:
             model_type: 0表示预训练模型，1表示自定义训练模型
+            precision: 推理精度 ("fp32"、"fp16"、"int8")，INT8模型不存在时使用FP32模型
+        
+        返回:
+            是否加载了真实模型；模型文件损坏或无法读取时打印错误并使用模拟分割
         """
-        # 在实际应用中，这里应该加载真实的模型
+        if precision not in PRECISIONS:
+            raise ValueError(f"未知的推理精度: {precision}")
+        path = os.path.join(MODEL_DIR, MODEL_FILES[model_type])
+        try:
+            self.session = get_session(path, self.INPUT_SIZE, precision)
+            if self.session is None and precision == "int8" and os.path.isfile(path):
+                print("未找到INT8量化模型，使用FP32模型 (可运行 python -m algorithms.segmentation.quantization 生成)")
+                self.session = get_session(path, self.INPUT_SIZE)
+        except Exception as e:
+            # 除cv2.error外，文件无法读取 (OSError) 或内容损坏也可能抛出其他异常，不能传到分割线程
+            print(f"U-Net模型加载失败: {str(e)}")
+            self.session = None
+        self.model_type = model_type
+        self.precision = precision
         self.model_loaded = True
+        return self.session is not None
+    
+    def predict_batch(self, images, model_type=0, precision="fp32"):
+        """
+        对一批图像做一次前向传播
+        
+        参数:
+            images: 图像列表 (灰度或彩色，尺寸可以不同)
+            model_type: 模型类型 (0: 预训练, 1: 自定义)
+            precision: 推理精度 ("fp32"、"fp16"、"int8")
+        
+        返回:
+            每幅图像的前景概率图列表 (float32，与对应输入图像尺寸相同)，没有可用模型时返回None
+        """
+        if not self.model_loaded or self.model_type != model_type or self.precision != precision:
+            self.load_model(model_type, precision)
+        if self.session is None:
+            return None
+        
+        grays = [cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) > 2 else image for image in images]
+        size = self.session.input_size
+        blob = cv2.dnn.blobFromImages(grays, scalefactor=1.0 / 255, size=(size, size))
+        probabilities = self.session.forward(blob)
+        
+        # 将概率图调整回各自的原始尺寸
+        return [cv2.resize(prob, (gray.shape[1], gray.shape[0]), interpolation=cv2.INTER_LINEAR)
+                for prob, gray in zip(probabilities, grays)]
     
-    def process(self, image, model_type=0, confidence=0.5, **kwargs):
+    def predict_tiled(self, image, model_type=0, tile_size=None, overlap=64, batch_size=8, precision="fp32"):
+        """
+        原分辨率滑窗分块推理
+        
+        图像被划分为相互重叠的tile，每batch_size个tile做一次前向传播；各tile的logit
+        按二维Hann窗加权累加，重叠处平滑过渡。除输入图像外只需要两幅float32累加图
+        和一个批次的tile，内存与图像面积成正比，不随模型在整幅图像上的激活增长。
+        
+        参数:
+            image: 输入图像 (灰度或彩色)
+            model_type: 模型类型 (0: 预训练, 1: 自定义)
+            tile_size: tile边长，为None时等于模型输入边长
+            overlap: 相邻tile的重叠像素数
+            batch_size: 每次前向传播的tile数
+            precision: 推理精度 ("fp32"、"fp16"、"int8")
+        
+        返回:
+            与输入图像尺寸相同的前景概率图 (float32)，没有可用模型时返回None
+        """
+        if not self.model_loaded or self.model_type != model_type or self.precision != precision:
+            self.load_model(model_type, precision)
+        if self.session is None:
+            return None
+        
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) > 2 else image
+        tile = tile_size or self.session.input_size
+        overlap = min(max(int(overlap), 0), tile - 1)
+        h, w = gray.shape
+        
+        # 图像小于tile时镜像填充
+        padded = cv2.copyMakeBorder(gray, 0, max(tile - h, 0), 0, max(tile - w, 0), cv2.BORDER_REFLECT_101)
+        ph, pw = padded.shape
+        ys = self._tile_starts(ph, tile, tile - overlap)
+        xs = self._tile_starts(pw, tile, tile - overlap)
+        positions = [(y, x) for y in ys for x in xs]
+        
+        # Hann窗权重，加下限避免只被tile边缘覆盖的图像边界处权重为0
+        window = np.hanning(tile + 2)[1:-1].astype(np.float32)
+        weight = np.maximum(np.outer(window, window), 1e-3)
+        logits = np.zeros((ph, pw), dtype=np.float32)
+        weights = np.zeros((ph, pw), dtype=np.float32)
+        
+        size = self.session.input_size
+        for start in range(0, len(positions), batch_size):
+            chunk = positions[start:start + batch_size]
+            tiles = [padded[y:y + tile, x:x + tile] for y, x in chunk]
+            blob = cv2.dnn.blobFromImages(tiles, scalefactor=1.0 / 255, size=(size, size))
+            probabilities = self.session.forward(blob)
+            for (y, x), prob in zip(chunk, probabilities):
+                if prob.shape[0] != tile:
+                    prob = cv2.resize(prob, (tile, tile), interpolation=cv2.INTER_LINEAR)
+                # 在logit空间加权融合
+                prob = np.clip(prob, 1e-6, 1 - 1e-6)
+                logits[y:y + tile, x:x + tile] += np.log(prob / (1 - prob)) * weight
+                weights[y:y + tile, x:x + tile] += weight
+        
+        # 原地计算sigmoid，避免再分配整幅图像大小的临时数组
+        logits /= weights
+        np.negative(logits, out=logits)
+        np.exp(logits, out=logits)
+        logits += 1
+        np.reciprocal(logits, out=logits)
+        return np.ascontiguousarray(logits[:h, :w])
+    
+    def _tile_starts(self, length, tile, stride):
+        """
+        计算一个方向上各tile的起点，最后一个tile与边界对齐
+        """
+        starts = list(range(0, max(length - tile, 0) + 1, max(stride, 1)))
+        if starts[-1] + tile < length:
+            starts.append(length - tile)
+        return starts
+    
+    def process_batch(self, images, model_type=0, confidence=0.5, precision="fp32", **kwargs):
+        """
+        批量应用U-Net分割，有可用模型时所有图像只做一次前向传播
+        
+        参数:
+            images: 图像列表
+            model_type: 模型类型 (0: 预训练, 1: 自定义)
+            confidence: 置信度阈值
+            precision: 推理精度 ("fp32"、"fp16"、"int8")
+        
+        返回:
+            分割后的图像列表
+        """
+        probabilities = self.predict_batch(images, model_type, precision)
+        if probabilities is None:
+            return [self.process(image, model_type, confidence, precision=precision) for image in images]
+        return [self._apply_probability(image, prob, confidence) for image, prob in zip(images, probabilities)]
+    
+    def _apply_probability(self, image, probability, confidence):
+        """
+        按置信度阈值将概率图转为掩码并应用到灰度图像
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) > 2 else image
+        mask = cv2.compare(probability, confidence, cv2.CMP_GE)
+        return cv2.bitwise_and(gray, gray, mask=mask)
+    
+    def process(self, image, model_type=0, confidence=0.5, tiled=False, tile_size=None, overlap=64, batch_size=8,
+                precision="fp32", **kwargs):
         """
         应用U-Net分割
         
@@ -30,6 +272,9 @@ class UNet:
             image: 输入图像 (灰度或彩色)
             model_type: 模型类型 (0: 预训练, 1: 自定义)
             confidence: 置信度阈值
+            tiled: 是否在原分辨率下滑窗分块推理 (否则缩放到模型输入尺寸)
+            tile_size, overlap, batch_size: 分块推理参数，见predict_tiled
+            precision: 推理精度 ("fp32"、"fp16"、"int8")，见get_session
         
         返回:
             分割后的图像
@@ -41,38 +286,37 @@ class UNet:
             gray = image.copy()
         
         # 加载模型
-        if not self.model_loaded:
-            self.load_model(model_type)
+        if not self.model_loaded or self.model_type != model_type or self.precision != precision:
+            self.load_model(model_type, precision)
         
+        # 有真实模型时直接推理
+        if self.session is not None:
+            if tiled:
+                probability = self.predict_tiled(gray, model_type, tile_size, overlap, batch_size, precision)
+            else:
+                probability = self.predict_batch([gray], model_type, precision)[0]
+            return self._apply_probability(gray, probability, confidence)
+        
+        # 没有模型文件时使用模拟分割
         # 预处理图像
         # 在实际应用中，这里应该根据模型要求进行预处理
         processed = cv2.resize(gray, (256, 256))
         
         # 模拟U-Net预测 (使用简单的阈值和形态学操作代替)
-        _, thresh = cv2.threshold(processed, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        _, thresh = cv2.threshold(processed, ThresholdHistogram(processed).otsu(), 255, cv2.THRESH_BINARY)
         
         # 应用形态学操作
         kernel = np.ones((5, 5), np.uint8)
         opening = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=2)
         
         # 找到肺部区域 (模拟)
-        contours, _ = cv2.findContours(opening, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # 创建掩码
-        mask = np.zeros_like(processed)
-        
-        # 筛选轮廓
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            # 根据面积筛选轮廓，过滤掉太小的区域
-            if area > 500:  # 面积阈值可以根据需要调整
-                # 计算轮廓的置信度 (模拟)
-                # 在实际应用中，这应该是模型输出的置信度
-                contour_confidence = 0.7  # 模拟置信度
-                
-                # 根据置信度阈值筛选
-                if contour_confidence >= confidence:
-                    cv2.drawContours(mask, [contour], 0, 255, -1)
+        # 区域的置信度 (模拟)，在实际应用中这应该是模型输出的置信度
+        region_confidence = 0.7
+        if region_confidence >= confidence:
+            # 过滤掉太小的区域 (面积阈值可以根据需要调整)，并填充区域内部
+            mask = self.postprocessing.clean_mask(opening, keep_largest=0, min_area=501, smooth_radius=0)
+        else:
+            mask = np.zeros_like(processed)
         
         # 将掩码调整回原始图像大小
         mask_resized = cv2.resize(mask, (gray.shape[1], gray.shape[0]))
@@ -1,26 +1,110 @@
+import time
 import cv2
 import numpy as np
 
+from algorithms.image_cache import ImageCache, image_key
+from algorithms.segmentation.thresholding import ThresholdHistogram
+
 class Watershed:
     """
     分水岭分割
     将图像视为地形表面，通过模拟水流分割区域
     """
     
+    # 与distance无关的预处理阶段，按执行顺序
+    STAGES = ("threshold", "opening", "sure_bg", "distance_transform")
+    
     def __init__(self):
-        pass
+        # 预处理结果缓存，键为输入图像内容；拖动距离阈值时只重做标记和分水岭
+        self._cache = ImageCache(max_entries=4, max_bytes=128 * 1024 * 1024)
+        # 最近一次运行各预处理阶段的耗时 (秒)，以及是否命中缓存
+        # 命中缓存时为首次计算这些阶段的耗时，即本次节省的时间
+        self.last_stage_times = {}
+        self.last_cache_hit = False
     
-    def process(self, image, distance=9, **kwargs):
+    def process(self, image, distance=9, mode="opencv", **kwargs):
         """
         应用分水岭分割
         
         参数:
             image: 输入图像 (灰度或彩色)
             distance: 距离变换阈值
+            mode: 分水岭实现
+                "opencv": cv2.watershed，需要把灰度图扩展为3通道BGR图像 (默认)
+                "gray": 在单通道8位梯度图上按灰度级分桶的优先级泛洪，只处理未知区域，
+                    直接在标记图上原地写入，不需要3通道图像和整幅的中间标签图
         
         返回:
             分割后的图像
         """
+        labels = self.labels(image, distance, mode)
+        
+        # 创建结果图像
+        result = np.zeros(labels.shape, dtype=np.uint8)
+        result[labels > 1] = 255
+        
+        return result
+    
+    def labels(self, image, distance=9, mode="opencv"):
+        """
+        计算分水岭标签图
+        
+        参数同process
+        
+        返回:
+            int32标签图，1为背景，大于1为各前景区域；"opencv"模式下分水岭线为-1
+        """
+        stages = self.precompute(image)
+        sure_bg = stages["sure_bg"]
+        dist_transform = stages["distance_transform"]
+        
+        # 确定前景区域
+        # 直接输出8位掩码 (与THRESH_BINARY结果相同)，不产生float32中间图像
+        sure_fg = cv2.compare(dist_transform, distance * float(dist_transform.max()) / 100, cv2.CMP_GT)
+        
+        # 查找未知区域
+        unknown = cv2.subtract(sure_bg, sure_fg)
+        
+        # 标记
+        _, markers = cv2.connectedComponents(sure_fg)
+        markers += 1
+        markers[unknown == 255] = 0
+        
+        # 应用分水岭算法
+        if mode == "gray":
+            self._flood_unknown(self._gradient(image, stages), markers, unknown)
+        elif mode == "opencv":
+            # cv2.watershed只接受8位3通道图像
+            if len(image.shape) == 2:
+                color = cv2.cvtColor(stages["gray"], cv2.COLOR_GRAY2BGR)
+            else:
+                color = image
+            markers = cv2.watershed(color, markers)
+        else:
+            raise ValueError(f"未知的分水岭模式: {mode}")
+        
+        return markers.astype(np.int32, copy=False)
+    
+    def precompute(self, image):
+        """
+        计算与distance无关的预处理阶段 (Otsu阈值、开运算、确定背景、距离变换)，结果按图像内容缓存
+        
+        参数:
+            image: 输入图像 (灰度或彩色)
+        
+        返回:
+            包含gray、threshold、opening、sure_bg、distance_transform的字典
+        """
+        key = image_key(image)
+        stages = self._cache.get(key)
+        self.last_cache_hit = stages is not None
+        if stages is not None:
+            self.last_stage_times = stages["times"]
+            return stages
+        
+        times = {}
+        start = time.perf_counter()
+        
         # 确保图像是灰度图
         if len(image.shape) > 2:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -28,41 +112,121 @@ class Watershed:
             gray = image.copy()
         
         # 阈值处理
-        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        _, thresh = cv2.threshold(gray, ThresholdHistogram(gray).otsu(), 255, cv2.THRESH_BINARY_INV)
+        times["threshold"] = time.perf_counter() - start
         
         # 噪声去除
+        start = time.perf_counter()
         kernel = np.ones((3, 3), np.uint8)
         opening = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel, iterations=2)
+        times["opening"] = time.perf_counter() - start
         
         # 确定背景区域
+        start = time.perf_counter()
         sure_bg = cv2.dilate(opening, kernel, iterations=3)
+        times["sure_bg"] = time.perf_counter() - start
         
         # 距离变换
+        start = time.perf_counter()
         dist_transform = cv2.distanceTransform(opening, cv2.DIST_L2, 5)
+        times["distance_transform"] = time.perf_counter() - start
         
-        # 确定前景区域
-        _, sure_fg = cv2.threshold(dist_transform, distance * dist_transform.max() / 100, 255, 0)
-        sure_fg = np.uint8(sure_fg)
-        
-        # 查找未知区域
-        unknown = cv2.subtract(sure_bg, sure_fg)
-        
-        # 标记
-        _, markers = cv2.connectedComponents(sure_fg)
-        markers = markers + 1
-        markers[unknown == 255] = 0
+        stages = {"gray": gray, "threshold": thresh, "opening": opening,
+                  "sure_bg": sure_bg, "distance_transform": dist_transform, "times": times}
+        self._cache.put(key, stages)
+        self.last_stage_times = times
+        return stages
+    
+    def _flood_unknown(self, gradient, markers, unknown):
+        """
+        在梯度图上从标记泛洪未知区域，结果原地写入markers
         
-        # 创建彩色图像用于分水岭算法
-        if len(image.shape) == 2:
-            color_img = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
-        else:
-            color_img = image.copy()
+        优先级队列按8位梯度值分为256个桶，桶中只存放未知区域内等待标记的像素下标。
+        从与未知区域相邻的标记像素出发逐级泛洪：水位为level时，梯度不超过level的邻点立即获得
+        来源像素的标签并继续扩展，其余邻点放入其梯度值对应的桶，水位升到该值时再扩展。
+        每个像素只在第一次被相邻标签到达时入桶，标签即第一个到达的区域。
+        状态都保存在markers中 (0为尚未到达)，额外内存只有桶和每一步的邻点数组，与未知区域的边界长度成正比。
+        """
+        height, width = markers.shape
+        size = height * width
+        flat = markers.reshape(-1)
+        grad = gradient.reshape(-1)
+        index_type = np.int32 if size < 2 ** 31 else np.intp
+        offsets = np.array([-width, width, -1, 1], dtype=index_type)
+        # 未知区域贴近图像边界 (2像素以内) 时才需要逐点检查邻点是否在图像外；否则所有邻点都在图像内
+        touches_border = bool(unknown[:2].any() or unknown[-2:].any() or unknown[:, :2].any() or unknown[:, -2:].any())
         
-        # 应用分水岭算法
-        markers = cv2.watershed(color_img, markers)
+        # 初始队列：与未知区域4邻接的标记像素
+        cross = cv2.getStructuringElement(cv2.MORPH_CROSS, (3, 3))
+        ring = cv2.subtract(cv2.dilate(unknown, cross), unknown)
+        buckets = [[] for _ in range(256)]
+        buckets[0].append(np.flatnonzero(ring).astype(index_type))
+        del ring
         
-        # 创建结果图像
-        result = np.zeros_like(gray)
-        result[markers > 1] = 255
+        # 本级水位下到达、但梯度高于水位的像素 (下标, 梯度)，进入下一级前一次性分桶
+        waiting = []
+        for level in range(256):
+            if waiting:
+                indices = np.concatenate([indices for indices, _ in waiting])
+                values = np.concatenate([values for _, values in waiting])
+                waiting = []
+                indices = indices[np.argsort(values, kind="stable")]
+                counts = np.bincount(values, minlength=256)
+                ends = np.cumsum(counts)
+                for value in np.flatnonzero(counts):
+                    buckets[value].append(indices[ends[value] - counts[value]:ends[value]])
+            if not buckets[level]:
+                continue
+            batch = np.concatenate(buckets[level])
+            buckets[level] = None
+            while batch.size:
+                neighbors = self._unreached_neighbors(flat, batch, offsets, touches_border)
+                values = grad[neighbors]
+                now = values <= level
+                batch = neighbors[now]
+                if batch.size < neighbors.size:
+                    later = ~now
+                    waiting.append((neighbors[later], values[later]))
+    
+    def _unreached_neighbors(self, flat, batch, offsets, touches_border):
+        """
+        batch中像素的4邻点里尚未到达的像素，写入来源像素的标签后返回其下标
+        多个来源同时到达同一像素时只保留一个；touches_border为True时排除图像外的邻点
+        """
+        labels = flat[batch]
+        neighbors = batch[:, None] + offsets
+        if touches_border:
+            # 图像外的邻点 (及左右越界换行后的邻点) 换成像素自身，它已被标记，随后被过滤掉
+            width = offsets[1]
+            column = batch % width
+            for direction, outside in enumerate((batch < width, batch >= flat.size - width,
+                                                 column == 0, column == width - 1)):
+                np.copyto(neighbors[:, direction], batch, where=outside)
+        neighbors = neighbors.ravel()
+        sources = np.repeat(labels, 4)
+        free = flat[neighbors] == 0
+        neighbors = neighbors[free]
+        sources = sources[free]
         
-        return result
\ No newline at end of file
+        # 去重：先写入各自的负序号，读回仍是自己序号的才保留
+        stamps = -np.arange(1, neighbors.size + 1, dtype=flat.dtype)
+        flat[neighbors] = stamps
+        unique = flat[neighbors] == stamps
+        neighbors = neighbors[unique]
+        flat[neighbors] = sources[unique]
+        return neighbors
+    
+    def _gradient(self, image, stages):
+        """
+        "gray"模式的地形图：8位Sobel梯度幅值 (|gx|/2 + |gy|/2)，首次使用时计算并加入缓存
+        """
+        gradient = stages.get("gradient")
+        if gradient is None:
+            gray = stages["gray"]
+            gx = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 1, 0))
+            gy = cv2.convertScaleAbs(cv2.Sobel(gray, cv2.CV_16S, 0, 1))
+            gradient = cv2.addWeighted(gx, 0.5, gy, 0.5, 0)
+            stages["gradient"] = gradient
+            # 重新写入以更新缓存的内存统计
+            self._cache.put(image_key(image), stages)
+        return gradient
\ No newline at end of file
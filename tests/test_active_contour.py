@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from algorithms.segmentation.active_contour import getCycleEigvals, getDiagCycleMat, solveCycle
+
+@pytest.mark.parametrize("n", [5, 64, 101])
+def test_fft_solver_matches_dense_inverse(n):
+    alpha, beta, gamma = 0.5, 0.1, 0.1
+    dense = getDiagCycleMat(alpha, beta, n) + gamma * np.eye(n)
+    # 对称循环矩阵的特征值为首行的DFT
+    eigvals = getCycleEigvals(alpha, beta, gamma, n)
+    np.testing.assert_allclose(np.sort(np.linalg.eigvalsh(dense)),
+                               np.sort(np.fft.fft(dense[0]).real), atol=1e-10)
+    np.testing.assert_allclose(eigvals, np.fft.rfft(dense[0]).real, atol=1e-10)
+    
+    rhs = np.random.default_rng(n).normal(size=(3, 2, n))
+    np.testing.assert_allclose(solveCycle(eigvals, rhs), rhs @ np.linalg.inv(dense).T, atol=1e-9)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from algorithms.enhancement.guided_filter import GuidedFilter
+
+def film(size, seed=0):
+    """
+    带噪声的阶跃图像，左半暗右半亮
+    """
+    image = np.full((size, size), 60.0)
+    image[:, size // 2:] = 190.0
+    image += np.random.default_rng(seed).normal(0, 6, image.shape)
+    return np.uint8(np.clip(image, 0, 255))
+
+@pytest.mark.parametrize("radius, eps", [(1, 0.01), (2, 0.001)])
+def test_bilateral_grid_wide_grid_2048(radius, eps):
+    # 网格宽度 (灰度层数 * 列数) 超过cv2.remap的SHRT_MAX限制时按灰度层分段插值
+    image = film(2048)
+    result = GuidedFilter().process(image, radius=radius, eps=eps, method="bilateral_grid")
+    assert result.shape == image.shape
+    assert result.dtype == np.uint8
+    # 边缘两侧保持原来的灰度
+    assert abs(int(result[1024, 1000]) - 60) < 10
+    assert abs(int(result[1024, 1048]) - 190) < 10
+
+def test_bilateral_grid_banded_matches_single_plane():
+    image = np.float32(film(256)) / 255
+    reference = GuidedFilter().bilateral_grid(image, 2, 0.1)
+    banded = GuidedFilter()
+    banded.REMAP_MAX_COLS = 300
+    np.testing.assert_array_equal(banded.bilateral_grid(image, 2, 0.1), reference)
+
+@pytest.mark.parametrize("method", GuidedFilter.METHODS)
+def test_preserves_edge_and_smooths_noise(method):
+    image = film(256)
+    result = GuidedFilter().process(image, radius=8, eps=0.01, method=method)
+    assert result[:, :120].std() < image[:, :120].std() / 3
+    assert int(result[128, 136]) - int(result[128, 120]) > 100
@@ -0,0 +1,62 @@
+import cv2
+import numpy as np
+
+from algorithms.segmentation.region_growing import RegionGrowing
+
+def three_bands():
+    # 左中右三条灰度带：100、120、140
+    image = np.zeros((20, 60), np.uint8)
+    image[:, :20] = 100
+    image[:, 20:40] = 120
+    image[:, 40:] = 140
+    return image
+
+def test_band_goes_to_the_only_accepting_seed():
+    # 左种子阈值10不接受中间带，右种子阈值50接受全部，中间带不能因竞争丢失
+    labels = RegionGrowing().process_multi(three_bands(), [(5, 10), (50, 10)], thresholds=[10, 50])
+    assert (labels[:, :20] == 1).all()
+    assert (labels[:, 20:] == 2).all()
+
+def test_contested_band_goes_to_the_closest_seed():
+    # 两个种子都接受中间带，中间带与左种子的归一化差异 (20/60) 小于右种子 (20/30)
+    labels = RegionGrowing().process_multi(three_bands(), [(5, 10), (50, 10)], thresholds=[60, 30])
+    assert (labels[:, :40] == 1).all()
+    assert (labels[:, 40:] == 2).all()
+
+def test_exclusion_seed_is_background():
+    labels = RegionGrowing().process_multi(three_bands(), [(5, 10)], thresholds=50,
+                                           exclusion_seeds=[(50, 10)], exclusion_thresholds=50)
+    assert (labels[:, :20] == 1).all()
+    assert (labels[:, 40:] == 0).all()
+
+def test_single_seed_matches_flood():
+    image = cv2.imread("x-ray/00000001_000.png", cv2.IMREAD_GRAYSCALE)
+    region_growing = RegionGrowing()
+    labels = region_growing.process_multi(image, [(300, 500)], thresholds=12)
+    assert ((labels > 0) == (region_growing._grow_flood(image, (300, 500), 12) > 0)).all()
+
+def test_narrow_seed_on_corridor_does_not_cut_off_the_other_seed():
+    # 左侧房间为110，一像素宽的通道为100，通道后面的右侧房间为140，其余为0 (墙)；
+    # 窄阈值种子位于通道上并占据通道，左右房间只有宽阈值种子接受，右侧房间不能因通道被占据而丢失
+    image = np.zeros((20, 60), np.uint8)
+    image[:, :20] = 110
+    image[10, 20:40] = 100
+    image[:, 40:] = 140
+    labels = RegionGrowing().process_multi(image, [(5, 10), (30, 10)], thresholds=[50, 5])
+    assert (labels[:, :20] == 1).all()
+    assert (labels[10, 20:40] == 2).all()
+    assert (labels[:, 40:] == 1).all()
+    assert (labels[image == 0] == 0).all()
+
+def test_foreground_is_union_of_single_seed_regions():
+    image = cv2.imread("x-ray/00000001_000.png", cv2.IMREAD_GRAYSCALE)
+    seeds = [(300, 500), (700, 500), (500, 300), (500, 800)]
+    thresholds = [15, 20, 10, 25]
+    region_growing = RegionGrowing()
+    labels = region_growing.process_multi(image, seeds, thresholds=thresholds)
+    union = np.zeros(image.shape, bool)
+    for seed, threshold in zip(seeds, thresholds):
+        union |= region_growing._grow_flood(image, seed, threshold) > 0
+    assert ((labels > 0) == union).all()
+    for k, (x, y) in enumerate(seeds, start=1):
+        assert labels[y, x] == k
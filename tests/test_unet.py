@@ -0,0 +1,116 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+from onnx import TensorProto, helper, numpy_helper
+
+from algorithms.segmentation import unet
+
+def write_model(path, seed=0):
+    """
+    生成一个很小的ONNX模型：Conv(1->4, 3x3) -> Relu -> Conv(4->1, 1x1) -> Sigmoid，批大小可变
+    """
+    rng = np.random.default_rng(seed)
+    weights = [
+        numpy_helper.from_array(rng.normal(0, 0.5, (4, 1, 3, 3)).astype(np.float32), "w1"),
+        numpy_helper.from_array(rng.normal(0, 0.1, 4).astype(np.float32), "b1"),
+        numpy_helper.from_array(rng.normal(0, 0.5, (1, 4, 1, 1)).astype(np.float32), "w2"),
+        numpy_helper.from_array(np.zeros(1, np.float32), "b2"),
+    ]
+    nodes = [
+        helper.make_node("Conv", ["input", "w1", "b1"], ["conv1"], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["conv1"], ["relu"]),
+        helper.make_node("Conv", ["relu", "w2", "b2"], ["conv2"]),
+        helper.make_node("Sigmoid", ["conv2"], ["output"]),
+    ]
+    size = unet.UNet.INPUT_SIZE
+    graph = helper.make_graph(
+        nodes, "tiny_unet",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 1, size, size])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["N", 1, size, size])],
+        initializer=weights,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    write_model(str(tmp_path / unet.MODEL_FILES[0]))
+    monkeypatch.setattr(unet, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(unet, "_sessions", {})
+    return tmp_path
+
+def films():
+    image = cv2.imread("x-ray/00000001_000.png", cv2.IMREAD_GRAYSCALE)
+    return [image, cv2.resize(image, (300, 200)), cv2.cvtColor(cv2.resize(image, (128, 128)), cv2.COLOR_GRAY2BGR)]
+
+def test_predict_batch_matches_single_images(model_dir):
+    model = unet.UNet()
+    images = films()
+    batch = model.predict_batch(images)
+    assert model.session is not None
+    for image, probability in zip(images, batch):
+        single = model.predict_batch([image])[0]
+        assert probability.shape == image.shape[:2]
+        np.testing.assert_allclose(probability, single, atol=1e-5)
+    
+    segmented = model.process_batch(images, confidence=0.5)
+    for image, result in zip(images, segmented):
+        np.testing.assert_array_equal(result, model.process(image, confidence=0.5))
+
+def test_session_shared_and_reloaded_on_change(model_dir):
+    path = str(model_dir / unet.MODEL_FILES[0])
+    first = unet.UNet()
+    second = unet.UNet()
+    assert first.load_model(0)
+    assert second.load_model(0)
+    assert first.session is second.session
+    assert len(unet._sessions) == 1
+    
+    # 替换模型文件 (修改时间变化) 后重新加载，旧会话被丢弃
+    write_model(path, seed=1)
+    mtime = os.path.getmtime(path) + 10
+    os.utime(path, (mtime, mtime))
+    reloaded = unet.get_session(path, unet.UNet.INPUT_SIZE)
+    assert reloaded is not first.session
+    assert list(unet._sessions) == [(os.path.abspath(path), mtime, unet.UNet.INPUT_SIZE, "fp32")]
+    assert unet.get_session(path, unet.UNet.INPUT_SIZE) is reloaded
+
+def test_missing_model_falls_back_to_simulation(tmp_path, monkeypatch):
+    monkeypatch.setattr(unet, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(unet, "_sessions", {})
+    model = unet.UNet()
+    assert not model.load_model(0)
+    assert model.predict_batch(films()) is None
+
+def test_missing_int8_model_uses_fp32(model_dir, capsys):
+    model = unet.UNet()
+    images = films()
+    fp32 = model.process_batch(images, precision="fp32")
+    int8 = model.process_batch(images, precision="int8")
+    assert model.precision == "int8"
+    assert "未找到INT8量化模型" in capsys.readouterr().out
+    for expected, result in zip(fp32, int8):
+        np.testing.assert_array_equal(result, expected)
+
+def test_corrupt_model_falls_back_to_simulation(tmp_path, monkeypatch):
+    (tmp_path / unet.MODEL_FILES[0]).write_bytes(b"not an onnx model")
+    monkeypatch.setattr(unet, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(unet, "_sessions", {})
+    model = unet.UNet()
+    assert not model.load_model(0)
+    segmented = model.process_batch(films(), precision="int8")
+    assert model.precision == "int8"
+    assert len(segmented) == 3
+
+def test_unreadable_model_falls_back_to_simulation(model_dir, monkeypatch):
+    def unreadable(path):
+        raise OSError(f"无法读取 {path}")
+    monkeypatch.setattr(unet.cv2.dnn, "readNetFromONNX", unreadable)
+    model = unet.UNet()
+    assert not model.load_model(0)
+    assert model.predict_batch(films()) is None
@@ -0,0 +1,25 @@
+import cv2
+import numpy as np
+
+from algorithms.segmentation.watershed import Watershed
+
+def test_gray_flood_stops_at_ridge():
+    # 两个标记位于图像左右边缘，中间一列为高梯度脊线，未知区域贴着图像边界
+    gradient = np.zeros((40, 60), np.uint8)
+    gradient[:, 30] = 200
+    markers = np.zeros((40, 60), np.int32)
+    markers[20, 0] = 2
+    markers[20, 59] = 3
+    unknown = np.where(markers == 0, 255, 0).astype(np.uint8)
+    Watershed()._flood_unknown(gradient, markers, unknown)
+    assert (markers[:, :30] == 2).all()
+    assert (markers[:, 31:] == 3).all()
+    assert (markers[:, 30] > 1).all()
+
+def test_gray_mode_matches_opencv():
+    image = cv2.imread("x-ray/00000001_000.png", cv2.IMREAD_GRAYSCALE)
+    watershed = Watershed()
+    gray = watershed.process(image, mode="gray") > 0
+    opencv = watershed.process(image, mode="opencv") > 0
+    dice = 2 * (gray & opencv).sum() / (gray.sum() + opencv.sum())
+    assert dice > 0.97
@@ -0,0 +1,21 @@
+import cv2
+import numpy as np
+
+from algorithms.enhancement.wavelet_denoising import WaveletDenoising
+
+def test_single_color_image_is_not_a_stack():
+    gray = cv2.imread("x-ray/00000001_000.png", cv2.IMREAD_GRAYSCALE)[:300, :200]
+    color = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    wavelet = WaveletDenoising()
+    denoised = wavelet.process_batch(color)
+    assert denoised.shape == (1, 300, 200)
+    assert (denoised[0] == wavelet.process(color)).all()
+
+def test_gray_stack_matches_single_images():
+    gray = cv2.imread("x-ray/00000001_000.png", cv2.IMREAD_GRAYSCALE)
+    stack = np.stack([gray[:256, :256], gray[256:512, :256], gray[:256, 256:512]])
+    wavelet = WaveletDenoising()
+    denoised = wavelet.process_batch(stack)
+    assert denoised.shape == stack.shape
+    for image, result in zip(stack, denoised):
+        assert (result == wavelet.process(image)).all()
@@ -193,7 +193,8 @@ class HelpDialog(QDialog):
             {"name": "自适应直方图均衡化(CLAHE)", "anchor": "2-自适应直方图均衡化clahe"},
             {"name": "伽马校正", "anchor": "3-伽马校正"},
             {"name": "非锐化掩蔽", "anchor": "4-非锐化掩蔽"},
-            {"name": "小波去噪", "anchor": "5-小波去噪"}
+            {"name": "小波去噪", "anchor": "5-小波去噪"},
+            {"name": "引导滤波", "anchor": "6-引导滤波"}
         ]
         
         for algo in algorithms:
@@ -210,7 +211,8 @@ class HelpDialog(QDialog):
             {"name": "区域生长", "anchor": "2-区域生长"},
             {"name": "分水岭分割", "anchor": "3-分水岭分割"},
             {"name": "主动轮廓", "anchor": "4-主动轮廓snake算法"},
-            {"name": "U-Net深度学习分割", "anchor": "5-u-net深度学习分割"}
+            {"name": "U-Net深度学习分割", "anchor": "5-u-net深度学习分割"},
+            {"name": "水平集", "anchor": "6-水平集chan-vese模型"}
         ]
         
         for algo in seg_algorithms:
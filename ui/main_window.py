@@ -5,8 +5,8 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QTabWidget, QScrollArea, QMessageBox, QSlider,
                              QGroupBox, QGridLayout, QSplitter, QFrame,
                              QMenuBar, QMenu, QAction, QToolTip)
-from PyQt5.QtGui import QPixmap, QImage, QPalette, QColor, QIcon, QFont
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtGui import QPixmap, QImage, QPalette, QColor, QIcon, QFont, QCursor
+from PyQt5.QtCore import Qt, QSize, QEvent, QThread, pyqtSignal
 import cv2
 import numpy as np
 from matplotlib.figure import Figure
@@ -26,13 +26,46 @@ from algorithms.enhancement.clahe import CLAHE
 from algorithms.enhancement.gamma_correction import GammaCorrection
 from algorithms.enhancement.unsharp_masking import UnsharpMasking
 from algorithms.enhancement.wavelet_denoising import WaveletDenoising
-from algorithms.segmentation.thresholding import Thresholding
+from algorithms.enhancement.guided_filter import GuidedFilter
+from algorithms.segmentation.thresholding import Thresholding, ThresholdHistogram
 from algorithms.segmentation.region_growing import RegionGrowing
 from algorithms.segmentation.watershed import Watershed
 from algorithms.segmentation.active_contour import ActiveContour
 from algorithms.segmentation.unet import UNet
+from algorithms.segmentation.level_set import LevelSet
+from algorithms.segmentation.postprocessing import MaskPostprocessing
+
+class ProcessingWorker(QThread):
+    """
+    在后台线程中运行算法，避免长时间计算阻塞界面事件循环
+    """
+    result_ready = pyqtSignal(object)
+    error = pyqtSignal(str)
+    
+    def __init__(self, algorithm, image, params, parent=None, postprocessing=None):
+        super().__init__(parent)
+        self.algorithm = algorithm
+        self.image = image
+        self.params = params
+        # 可选的后处理 (算法实例, 参数)，在同一后台线程中对结果执行
+        self.postprocessing = postprocessing
+    
+    def run(self):
+        try:
+            result = self.algorithm.process(self.image, **self.params)
+            if self.postprocessing is not None:
+                postprocessing, params = self.postprocessing
+                result = postprocessing.process(self.image, result, **params)
+            self.result_ready.emit(result)
+        except Exception as e:
+            self.error.emit(str(e))
 
 class ImageViewer(QWidget):
+    # 选点完成时发出，参数为图像坐标系下的点列表 [(x, y), ...]
+    points_selected = pyqtSignal(list)
+    # 选点被取消时发出
+    selection_cancelled = pyqtSignal()
+    
     def __init__(self, title=""):
         super().__init__()
         self.layout = QVBoxLayout()
@@ -51,6 +84,8 @@ class ImageViewer(QWidget):
         self.image_label.setMinimumSize(400, 400)
         self.image_label.setStyleSheet("background-color: #f0f0f0; border: 1px solid #ddd;")
         self.layout.addWidget(self.image_label)
+        # 通过事件过滤器处理选点时的鼠标和键盘事件
+        self.image_label.installEventFilter(self)
         
         # 直方图
         self.figure = Figure(figsize=(5, 3))  # 增加高度
@@ -59,23 +94,125 @@ class ImageViewer(QWidget):
         
         self.image = None
     
+        # 选点状态
+        self.selecting = False
+        self.selected_points = []
+        self.min_points = 6
+    
     def set_image(self, image):
         self.image = image
         if image is not None:
-            h, w = image.shape[:2]
-            bytes_per_line = 3 * w
-            if len(image.shape) == 2:  # 灰度图
-                q_image = QImage(image.data, w, h, w, QImage.Format_Grayscale8)
-            else:  # 彩色图
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                q_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            
-            pixmap = QPixmap.fromImage(q_image)
-            self.image_label.setPixmap(pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            self.show_image(image)
             
             # 更新直方图
             self.update_histogram(image)
     
+    def show_image(self, image):
+        """
+        只刷新图像显示区域，不重新计算直方图
+        """
+        h, w = image.shape[:2]
+        bytes_per_line = 3 * w
+        if len(image.shape) == 2:  # 灰度图
+            q_image = QImage(image.data, w, h, w, QImage.Format_Grayscale8)
+        else:  # 彩色图
+            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            q_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format_RGB888)
+            
+        pixmap = QPixmap.fromImage(q_image)
+        self.image_label.setPixmap(pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+            
+    def start_point_selection(self, min_points=6):
+        """
+        开始在图像上选点：左键添加点，右键或回车确认，Esc取消
+        选点完全由Qt事件驱动，不阻塞界面
+        """
+        self.selected_points = []
+        self.min_points = min_points
+        self.selecting = True
+        self.image_label.setCursor(Qt.CrossCursor)
+        self.image_label.setFocusPolicy(Qt.StrongFocus)
+        self.image_label.setFocus()
+    
+    def stop_point_selection(self):
+        """
+        结束选点并恢复图像显示
+        """
+        if not self.selecting:
+            return
+        self.selecting = False
+        self.image_label.unsetCursor()
+        self.image_label.setFocusPolicy(Qt.NoFocus)
+        if self.image is not None:
+            self.show_image(self.image)
+    
+    def finish_point_selection(self):
+        """
+        确认选点，点数不足时提示并继续选点
+        """
+        if len(self.selected_points) < self.min_points:
+            QToolTip.showText(QCursor.pos(), f"请至少选择{self.min_points}个点")
+            return
+        points = list(self.selected_points)
+        self.stop_point_selection()
+        self.points_selected.emit(points)
+    
+    def eventFilter(self, obj, event):
+        if obj is self.image_label and self.selecting:
+            if event.type() == QEvent.MouseButtonPress:
+                if event.button() == Qt.LeftButton:
+                    point = self.map_to_image(event.pos())
+                    if point is not None:
+                        self.selected_points.append(point)
+                        self.draw_selection()
+                elif event.button() == Qt.RightButton:
+                    self.finish_point_selection()
+                return True
+            if event.type() == QEvent.KeyPress:
+                if event.key() in (Qt.Key_Return, Qt.Key_Enter):
+                    self.finish_point_selection()
+                    return True
+                if event.key() == Qt.Key_Escape:
+                    self.stop_point_selection()
+                    self.selection_cancelled.emit()
+                    return True
+        return super().eventFilter(obj, event)
+    
+    def map_to_image(self, pos):
+        """
+        将图像标签上的坐标映射为原图坐标，点在图像外时返回None
+        """
+        pixmap = self.image_label.pixmap()
+        if self.image is None or pixmap is None or pixmap.isNull():
+            return None
+        h, w = self.image.shape[:2]
+        # 缩放后的图像在标签内容区域中居中显示
+        rect = self.image_label.contentsRect()
+        offset_x = rect.x() + (rect.width() - pixmap.width()) / 2
+        offset_y = rect.y() + (rect.height() - pixmap.height()) / 2
+        x = (pos.x() - offset_x) * w / pixmap.width()
+        y = (pos.y() - offset_y) * h / pixmap.height()
+        if not (0 <= x < w and 0 <= y < h):
+            return None
+        return (int(x), int(y))
+    
+    def draw_selection(self):
+        """
+        在图像上绘制已选择的点和连线
+        """
+        if len(self.image.shape) == 2:
+            overlay = cv2.cvtColor(self.image, cv2.COLOR_GRAY2BGR)
+        else:
+            overlay = self.image.copy()
+        # 按图像尺寸调整线宽，保证缩放显示后仍然可见
+        thickness = max(1, max(overlay.shape[:2]) // 300)
+        points = np.array(self.selected_points, dtype=np.int32)
+        if len(points) > 1:
+            cv2.polylines(overlay, [points], len(points) > 2, (0, 255, 0), thickness, cv2.LINE_AA)
+        for point in self.selected_points:
+            cv2.circle(overlay, point, thickness * 3, (0, 255, 0), -1)
+        self.show_image(overlay)
+    
     def update_histogram(self, image):
         self.figure.clear()
         ax = self.figure.add_subplot(111)
@@ -95,6 +232,9 @@ class ImageViewer(QWidget):
         self.canvas.draw()
 
 class MainWindow(QMainWindow):
+    # 阈值分割方法，与阈值方法下拉框的顺序对应
+    THRESHOLD_METHODS = ["manual", "otsu", "multi_otsu", "triangle", "li", "adaptive_mean", "niblack", "sauvola"]
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("LungVision - 胸部X-Ray图像分析系统")
@@ -241,6 +381,8 @@ class MainWindow(QMainWindow):
         
         # 原始图像显示
         self.original_viewer = ImageViewer("原始图像")
+        self.original_viewer.points_selected.connect(self.on_contour_points_selected)
+        self.original_viewer.selection_cancelled.connect(self.on_contour_selection_cancelled)
         display_layout.addWidget(self.original_viewer)
         
         # 处理后图像显示
@@ -285,7 +427,8 @@ class MainWindow(QMainWindow):
             "自适应直方图均衡化(CLAHE)",
             "伽马校正",
             "非锐化掩蔽",
-            "小波去噪"
+            "小波去噪",
+            "引导滤波"
         ])
         self.enhancement_combo.currentIndexChanged.connect(self.update_enhancement_params)
         algo_selection_layout.addWidget(self.enhancement_combo)
@@ -375,7 +518,8 @@ class MainWindow(QMainWindow):
             "区域生长",
             "分水岭分割",
             "主动轮廓",
-            "U-Net深度学习"
+            "U-Net深度学习",
+            "水平集"
         ])
         self.segmentation_combo.currentIndexChanged.connect(self.update_segmentation_params)
         seg_algo_selection_layout.addWidget(self.segmentation_combo)
@@ -421,6 +565,48 @@ class MainWindow(QMainWindow):
         params_container_layout.addStretch()
         segmentation_group_layout.addWidget(self.segmentation_params_container)
         
+        # 分割后处理，对所有分割算法可选
+        from PyQt5.QtWidgets import QCheckBox
+        postprocess_widget = QWidget()
+        postprocess_layout = QGridLayout(postprocess_widget)
+        postprocess_layout.setContentsMargins(5, 5, 5, 5)
+        postprocess_layout.setSpacing(10)
+        
+        self.postprocess_checkbox = QCheckBox("分割后处理")
+        self.postprocess_checkbox.setChecked(False)
+        self.postprocess_checkbox.setToolTip("去除斑点，只保留面积最大的若干区域 (如左右两肺)，平滑边界并填充孔洞")
+        postprocess_layout.addWidget(self.postprocess_checkbox, 0, 0, 1, 3)
+        
+        keep_label = QLabel("保留区域数:")
+        self.postprocess_keep_slider = QSlider(Qt.Horizontal)
+        self.postprocess_keep_slider.setRange(0, 5)
+        self.postprocess_keep_slider.setValue(2)
+        self.postprocess_keep_value = QLabel("2")
+        self.postprocess_keep_value.setMinimumWidth(40)
+        self.postprocess_keep_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.postprocess_keep_slider.valueChanged.connect(
+            lambda v: self.postprocess_keep_value.setText(f"{v}" if v > 0 else "不限")
+        )
+        postprocess_layout.addWidget(keep_label, 1, 0)
+        postprocess_layout.addWidget(self.postprocess_keep_slider, 1, 1)
+        postprocess_layout.addWidget(self.postprocess_keep_value, 1, 2)
+        
+        smooth_label = QLabel("平滑半径:")
+        self.postprocess_smooth_slider = QSlider(Qt.Horizontal)
+        self.postprocess_smooth_slider.setRange(0, 10)
+        self.postprocess_smooth_slider.setValue(2)
+        self.postprocess_smooth_value = QLabel("2")
+        self.postprocess_smooth_value.setMinimumWidth(40)
+        self.postprocess_smooth_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.postprocess_smooth_slider.valueChanged.connect(
+            lambda v: self.postprocess_smooth_value.setText(f"{v}")
+        )
+        postprocess_layout.addWidget(smooth_label, 2, 0)
+        postprocess_layout.addWidget(self.postprocess_smooth_slider, 2, 1)
+        postprocess_layout.addWidget(self.postprocess_smooth_value, 2, 2)
+        
+        segmentation_group_layout.addWidget(postprocess_widget)
+        
         # 应用分割按钮
         seg_button_container = QWidget()
         seg_button_layout = QHBoxLayout(seg_button_container)
@@ -458,6 +644,15 @@ class MainWindow(QMainWindow):
         self.processed_image = None
         self.current_enhancement = None
         self.current_segmentation = None
+        # 后台分割线程，以及等待用户选点的分割任务
+        self.segmentation_worker = None
+        self.pending_segmentation = None
+        # 分割任务的代号，加载新图像或重置时递增，旧任务的结果到达后被丢弃
+        self.segmentation_generation = 0
+        # 分割掩码后处理
+        self.mask_postprocessing = MaskPostprocessing()
+        # 阈值分割预览使用的直方图，(输入图像, ThresholdHistogram)
+        self.threshold_histogram_cache = None
         
         # 初始化算法实例
         self.enhancement_algorithms = {
@@ -465,7 +660,8 @@ class MainWindow(QMainWindow):
             1: CLAHE(),
             2: GammaCorrection(),
             3: UnsharpMasking(),
-            4: WaveletDenoising()
+            4: WaveletDenoising(),
+            5: GuidedFilter()
         }
         
         self.segmentation_algorithms = {
@@ -473,7 +669,8 @@ class MainWindow(QMainWindow):
             1: RegionGrowing(),
             2: Watershed(),
             3: ActiveContour(),
-            4: UNet()
+            4: UNet(),
+            5: LevelSet()
         }
         
         # 初始化参数控件
@@ -497,17 +694,24 @@ class MainWindow(QMainWindow):
                 else:
                     self.original_image_gray = self.original_image.copy()
                 
+                # 结束未完成的选点，丢弃正在运行的分割的结果
+                self.original_viewer.stop_point_selection()
+                self.pending_segmentation = None
+                self.segmentation_generation += 1
+                
                 # 显示原始图像
                 self.original_viewer.set_image(self.original_image)
                 self.processed_viewer.set_image(None)
                 
                 # 启用按钮
                 self.apply_enhancement_button.setEnabled(True)
-                self.apply_segmentation_button.setEnabled(True)
+                # 后台分割结束前不能启动新的分割，线程结束时再启用
+                self.apply_segmentation_button.setEnabled(not self.is_segmentation_running())
                 self.reset_button.setEnabled(True)
                 
                 self.processed_image = None
                 self.save_button.setEnabled(False)
+                self.update_threshold_preview()
                 
                 self.statusBar().showMessage(f"已加载图像: {os.path.basename(file_path)}")
             except Exception as e:
@@ -585,7 +789,7 @@ class MainWindow(QMainWindow):
             # 添加半径参数
             radius_label = QLabel("模糊半径:")
             self.unsharp_radius_slider = QSlider(Qt.Horizontal)
-            self.unsharp_radius_slider.setRange(1, 20)
+            self.unsharp_radius_slider.setRange(1, 100)
             self.unsharp_radius_slider.setValue(5)
             self.unsharp_radius_value = QLabel("5")
             self.unsharp_radius_value.setMinimumWidth(40)
@@ -637,6 +841,66 @@ class MainWindow(QMainWindow):
             form_layout.addWidget(wavelet_type_label, row, 0)
             form_layout.addWidget(self.wavelet_type_combo, row, 1, 1, 2)
         
+        elif index == 5:  # 引导滤波
+            # 添加半径参数
+            radius_label = QLabel("半径:")
+            self.guided_radius_slider = QSlider(Qt.Horizontal)
+            self.guided_radius_slider.setRange(1, 60)
+            self.guided_radius_slider.setValue(8)
+            self.guided_radius_slider.setToolTip("窗口半径，耗时与半径无关")
+            self.guided_radius_value = QLabel("8")
+            self.guided_radius_value.setMinimumWidth(40)
+            self.guided_radius_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.guided_radius_slider.valueChanged.connect(
+                lambda v: self.guided_radius_value.setText(f"{v}")
+            )
+            form_layout.addWidget(radius_label, row, 0)
+            form_layout.addWidget(self.guided_radius_slider, row, 1)
+            form_layout.addWidget(self.guided_radius_value, row, 2)
+            row += 1
+            
+            # 添加平滑强度参数 (eps)
+            eps_label = QLabel("平滑强度:")
+            self.guided_eps_slider = QSlider(Qt.Horizontal)
+            self.guided_eps_slider.setRange(1, 100)
+            self.guided_eps_slider.setValue(10)
+            self.guided_eps_slider.setToolTip("正则化参数eps，局部方差小于该值的区域被平滑，值越大保留的边缘越少")
+            self.guided_eps_value = QLabel("0.010")
+            self.guided_eps_value.setMinimumWidth(40)
+            self.guided_eps_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.guided_eps_slider.valueChanged.connect(
+                lambda v: self.guided_eps_value.setText(f"{v/1000:.3f}")
+            )
+            form_layout.addWidget(eps_label, row, 0)
+            form_layout.addWidget(self.guided_eps_slider, row, 1)
+            form_layout.addWidget(self.guided_eps_value, row, 2)
+            row += 1
+            
+            # 添加细节增益参数
+            detail_label = QLabel("细节增益:")
+            self.guided_detail_slider = QSlider(Qt.Horizontal)
+            self.guided_detail_slider.setRange(0, 30)
+            self.guided_detail_slider.setValue(0)
+            self.guided_detail_slider.setToolTip("0为纯平滑，1为原图，大于1时放大细节")
+            self.guided_detail_value = QLabel("0.0")
+            self.guided_detail_value.setMinimumWidth(40)
+            self.guided_detail_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.guided_detail_slider.valueChanged.connect(
+                lambda v: self.guided_detail_value.setText(f"{v/10:.1f}")
+            )
+            form_layout.addWidget(detail_label, row, 0)
+            form_layout.addWidget(self.guided_detail_slider, row, 1)
+            form_layout.addWidget(self.guided_detail_value, row, 2)
+            row += 1
+            
+            # 添加平滑方式选择
+            method_label = QLabel("平滑方式:")
+            self.guided_method_combo = QComboBox()
+            self.guided_method_combo.addItems(["引导滤波", "双边网格"])
+            self.guided_method_combo.setToolTip("双边网格：快速双边滤波，半径为空间标准差，适合较大半径")
+            form_layout.addWidget(method_label, row, 0)
+            form_layout.addWidget(self.guided_method_combo, row, 1, 1, 2)
+        
         # 添加表单到布局
         self.enhancement_params_layout.addWidget(form_widget)
     
@@ -656,6 +920,15 @@ class MainWindow(QMainWindow):
         
         # 根据选择的算法添加参数控件
         if index == 0:  # 阈值分割
+            # 添加阈值方法选择
+            method_label = QLabel("阈值方法:")
+            self.threshold_method_combo = QComboBox()
+            self.threshold_method_combo.addItems(["手动", "Otsu", "多级Otsu (3类)", "三角法", "Li",
+                                                  "局部均值", "Niblack", "Sauvola"])
+            form_layout.addWidget(method_label, row, 0)
+            form_layout.addWidget(self.threshold_method_combo, row, 1, 1, 2)
+            row += 1
+            
             # 添加阈值参数
             threshold_label = QLabel("阈值:")
             self.threshold_slider = QSlider(Qt.Horizontal)
@@ -667,6 +940,7 @@ class MainWindow(QMainWindow):
             self.threshold_slider.valueChanged.connect(
                 lambda v: self.threshold_value.setText(f"{v}")
             )
+            self.threshold_slider.valueChanged.connect(self.update_threshold_preview)
             form_layout.addWidget(threshold_label, row, 0)
             form_layout.addWidget(self.threshold_slider, row, 1)
             form_layout.addWidget(self.threshold_value, row, 2)
@@ -678,6 +952,64 @@ class MainWindow(QMainWindow):
             self.threshold_type_combo.addItems(["二值化", "反二值化", "截断", "阈值为零", "反阈值为零"])
             form_layout.addWidget(threshold_type_label, row, 0)
             form_layout.addWidget(self.threshold_type_combo, row, 1, 1, 2)
+            row += 1
+            
+            # 添加局部自适应阈值的窗口大小
+            window_label = QLabel("局部窗口:")
+            self.threshold_window_slider = QSlider(Qt.Horizontal)
+            self.threshold_window_slider.setRange(1, 150)
+            self.threshold_window_slider.setValue(25)
+            self.threshold_window_value = QLabel("51")
+            self.threshold_window_value.setMinimumWidth(40)
+            self.threshold_window_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.threshold_window_slider.valueChanged.connect(
+                lambda v: self.threshold_window_value.setText(f"{2 * v + 1}")
+            )
+            form_layout.addWidget(window_label, row, 0)
+            form_layout.addWidget(self.threshold_window_slider, row, 1)
+            form_layout.addWidget(self.threshold_window_value, row, 2)
+            row += 1
+            
+            # 添加Niblack/Sauvola的标准差权重
+            k_label = QLabel("标准差权重k:")
+            self.threshold_k_slider = QSlider(Qt.Horizontal)
+            self.threshold_k_slider.setRange(0, 100)
+            self.threshold_k_slider.setValue(20)
+            self.threshold_k_value = QLabel("0.20")
+            self.threshold_k_value.setMinimumWidth(40)
+            self.threshold_k_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.threshold_k_slider.valueChanged.connect(
+                lambda v: self.threshold_k_value.setText(f"{v/100:.2f}")
+            )
+            form_layout.addWidget(k_label, row, 0)
+            form_layout.addWidget(self.threshold_k_slider, row, 1)
+            form_layout.addWidget(self.threshold_k_value, row, 2)
+            row += 1
+            
+            # 添加局部均值阈值的偏移量
+            offset_label = QLabel("均值偏移:")
+            self.threshold_offset_slider = QSlider(Qt.Horizontal)
+            self.threshold_offset_slider.setRange(-50, 50)
+            self.threshold_offset_slider.setValue(0)
+            self.threshold_offset_value = QLabel("0")
+            self.threshold_offset_value.setMinimumWidth(40)
+            self.threshold_offset_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.threshold_offset_slider.valueChanged.connect(
+                lambda v: self.threshold_offset_value.setText(f"{v}")
+            )
+            form_layout.addWidget(offset_label, row, 0)
+            form_layout.addWidget(self.threshold_offset_slider, row, 1)
+            form_layout.addWidget(self.threshold_offset_value, row, 2)
+            row += 1
+            
+            # 添加前景占比预览 (由直方图直接得到，拖动滑块时即时更新)
+            preview_label = QLabel("前景占比:")
+            self.threshold_preview_value = QLabel("-")
+            form_layout.addWidget(preview_label, row, 0)
+            form_layout.addWidget(self.threshold_preview_value, row, 1, 1, 2)
+            
+            self.threshold_method_combo.currentIndexChanged.connect(self.update_threshold_method)
+            self.update_threshold_method(0)
             
         elif index == 1:  # 区域生长
             # 添加种子点X坐标输入
@@ -750,6 +1082,15 @@ class MainWindow(QMainWindow):
             form_layout.addWidget(distance_label, row, 0)
             form_layout.addWidget(self.watershed_distance_slider, row, 1)
             form_layout.addWidget(self.watershed_distance_value, row, 2)
+            row += 1
+            
+            # 添加实现方式选择
+            mode_label = QLabel("实现方式:")
+            self.watershed_mode_combo = QComboBox()
+            self.watershed_mode_combo.addItems(["OpenCV", "单通道梯度"])
+            self.watershed_mode_combo.setToolTip("单通道梯度：直接在灰度梯度图上泛洪未知区域，不需要转换为3通道图像，内存占用更低但速度较慢")
+            form_layout.addWidget(mode_label, row, 0)
+            form_layout.addWidget(self.watershed_mode_combo, row, 1, 1, 2)
             
         elif index == 3:  # 主动轮廓
             # 添加迭代次数参数
@@ -800,6 +1141,32 @@ class MainWindow(QMainWindow):
             form_layout.addWidget(self.contour_beta_value, row, 2)
             row += 1
             
+            # 添加金字塔层数参数
+            pyramid_label = QLabel("金字塔层数:")
+            self.contour_pyramid_slider = QSlider(Qt.Horizontal)
+            self.contour_pyramid_slider.setRange(0, 4)
+            self.contour_pyramid_slider.setValue(0)
+            self.contour_pyramid_slider.setToolTip("大于0时先在低分辨率下收敛，再逐层细化，迭代次数为每层的最大值")
+            self.contour_pyramid_value = QLabel("0")
+            self.contour_pyramid_value.setMinimumWidth(40)
+            self.contour_pyramid_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.contour_pyramid_slider.valueChanged.connect(
+                lambda v: self.contour_pyramid_value.setText(f"{v}")
+            )
+            form_layout.addWidget(pyramid_label, row, 0)
+            form_layout.addWidget(self.contour_pyramid_slider, row, 1)
+            form_layout.addWidget(self.contour_pyramid_value, row, 2)
+            row += 1
+            
+            # 添加外力类型选择
+            force_label = QLabel("外力类型:")
+            self.contour_force_combo = QComboBox()
+            self.contour_force_combo.addItems(["梯度", "梯度向量流(GVF)"])
+            self.contour_force_combo.setToolTip("GVF的捕获范围更大，初始轮廓可以离目标边界较远，也能进入凹陷区域")
+            form_layout.addWidget(force_label, row, 0)
+            form_layout.addWidget(self.contour_force_combo, row, 1, 1, 2)
+            row += 1
+            
             # 添加手动选择初始轮廓选项
             from PyQt5.QtWidgets import QCheckBox
             manual_init_widget = QWidget()
@@ -808,7 +1175,7 @@ class MainWindow(QMainWindow):
             
             self.manual_init_checkbox = QCheckBox("手动选择初始轮廓")
             self.manual_init_checkbox.setChecked(True)
-            self.manual_init_checkbox.setToolTip("启用后，可以手动选择初始轮廓点，适用于肺叶不在图像中心的情况")
+            self.manual_init_checkbox.setToolTip("启用后，应用分割时在原始图像上点击选择初始轮廓点，适用于肺叶不在图像中心的情况")
             manual_init_layout.addWidget(self.manual_init_checkbox)
             
             form_layout.addWidget(manual_init_widget, row, 0, 1, 3)
@@ -836,6 +1203,65 @@ class MainWindow(QMainWindow):
             form_layout.addWidget(confidence_label, row, 0)
             form_layout.addWidget(self.unet_confidence_slider, row, 1)
             form_layout.addWidget(self.unet_confidence_value, row, 2)
+            row += 1
+            
+            # 添加分块推理选项
+            from PyQt5.QtWidgets import QCheckBox
+            self.unet_tiled_checkbox = QCheckBox("原分辨率分块推理")
+            self.unet_tiled_checkbox.setChecked(False)
+            self.unet_tiled_checkbox.setToolTip("在原始分辨率下用重叠的滑窗逐块推理并加权融合，边界更精细但耗时更长；需要models目录中有模型文件")
+            form_layout.addWidget(self.unet_tiled_checkbox, row, 0, 1, 3)
+        
+        elif index == 5:  # 水平集
+            # 添加最大迭代次数参数
+            iterations_label = QLabel("最大迭代次数:")
+            self.level_set_iterations_slider = QSlider(Qt.Horizontal)
+            self.level_set_iterations_slider.setRange(100, 5000)
+            self.level_set_iterations_slider.setSingleStep(100)
+            self.level_set_iterations_slider.setValue(2000)
+            self.level_set_iterations_value = QLabel("2000")
+            self.level_set_iterations_value.setMinimumWidth(40)
+            self.level_set_iterations_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.level_set_iterations_slider.valueChanged.connect(
+                lambda v: self.level_set_iterations_value.setText(f"{v}")
+            )
+            form_layout.addWidget(iterations_label, row, 0)
+            form_layout.addWidget(self.level_set_iterations_slider, row, 1)
+            form_layout.addWidget(self.level_set_iterations_value, row, 2)
+            row += 1
+            
+            # 添加曲率权重参数
+            mu_label = QLabel("曲率权重:")
+            self.level_set_mu_slider = QSlider(Qt.Horizontal)
+            self.level_set_mu_slider.setRange(0, 100)
+            self.level_set_mu_slider.setValue(20)
+            self.level_set_mu_slider.setToolTip("值越大，边界越平滑")
+            self.level_set_mu_value = QLabel("0.20")
+            self.level_set_mu_value.setMinimumWidth(40)
+            self.level_set_mu_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.level_set_mu_slider.valueChanged.connect(
+                lambda v: self.level_set_mu_value.setText(f"{v/100:.2f}")
+            )
+            form_layout.addWidget(mu_label, row, 0)
+            form_layout.addWidget(self.level_set_mu_slider, row, 1)
+            form_layout.addWidget(self.level_set_mu_value, row, 2)
+            row += 1
+            
+            # 添加窄带宽度参数
+            band_label = QLabel("窄带宽度:")
+            self.level_set_band_slider = QSlider(Qt.Horizontal)
+            self.level_set_band_slider.setRange(2, 10)
+            self.level_set_band_slider.setValue(5)
+            self.level_set_band_slider.setToolTip("只更新零水平集两侧该距离内的像素，越宽重新初始化越少，但每次迭代更慢")
+            self.level_set_band_value = QLabel("5")
+            self.level_set_band_value.setMinimumWidth(40)
+            self.level_set_band_value.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.level_set_band_slider.valueChanged.connect(
+                lambda v: self.level_set_band_value.setText(f"{v}")
+            )
+            form_layout.addWidget(band_label, row, 0)
+            form_layout.addWidget(self.level_set_band_slider, row, 1)
+            form_layout.addWidget(self.level_set_band_value, row, 2)
         
         # 添加表单到布局
         self.segmentation_params_layout.addWidget(form_widget)
@@ -867,6 +1293,12 @@ class MainWindow(QMainWindow):
                 threshold = self.wavelet_threshold_slider.value()
                 wavelet = self.wavelet_type_combo.currentText()
                 params = {"threshold": threshold, "wavelet": wavelet}
+            elif index == 5:  # 引导滤波
+                radius = self.guided_radius_slider.value()
+                eps = self.guided_eps_slider.value() / 1000.0
+                detail = self.guided_detail_slider.value() / 10.0
+                method = ["guided", "bilateral_grid"][self.guided_method_combo.currentIndex()]
+                params = {"radius": radius, "eps": eps, "detail": detail, "method": method}
             
             # 应用增强算法
             self.processed_image = algorithm.process(self.original_image_gray, **params)
@@ -883,6 +1315,7 @@ class MainWindow(QMainWindow):
             # 记录当前处理
             self.current_enhancement = index
             self.current_segmentation = None
+            self.update_threshold_preview()
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"应用增强算法时出错: {str(e)}")
@@ -903,7 +1336,11 @@ class MainWindow(QMainWindow):
             if index == 0:  # 阈值分割
                 threshold = self.threshold_slider.value()
                 threshold_type = self.threshold_type_combo.currentIndex()
-                params = {"threshold": threshold, "threshold_type": threshold_type}
+                method = self.THRESHOLD_METHODS[self.threshold_method_combo.currentIndex()]
+                params = {"threshold": threshold, "threshold_type": threshold_type, "method": method,
+                          "window_size": 2 * self.threshold_window_slider.value() + 1,
+                          "k": self.threshold_k_slider.value() / 100.0,
+                          "offset": self.threshold_offset_slider.value()}
             elif index == 1:  # 区域生长
                 # 使用用户输入的种子点坐标
                 h, w = input_image.shape[:2]
@@ -920,35 +1357,205 @@ class MainWindow(QMainWindow):
                 params = {"seed_point": seed_point, "threshold": threshold}
             elif index == 2:  # 分水岭算法
                 distance = self.watershed_distance_slider.value()
-                params = {"distance": distance}
+                mode = ["opencv", "gray"][self.watershed_mode_combo.currentIndex()]
+                params = {"distance": distance, "mode": mode}
             elif index == 3:  # 主动轮廓
                 iterations = self.contour_iterations_slider.value()
                 alpha = self.contour_alpha_slider.value() / 100.0
                 beta = self.contour_beta_slider.value() / 100.0
                 manual_init = self.manual_init_checkbox.isChecked()
-                params = {"iterations": iterations, "alpha": alpha, "beta": beta, "manual_init": manual_init}
+                pyramid_levels = self.contour_pyramid_slider.value()
+                force = ["gradient", "gvf"][self.contour_force_combo.currentIndex()]
+                params = {"iterations": iterations, "alpha": alpha, "beta": beta,
+                          "pyramid_levels": pyramid_levels, "force": force}
             elif index == 4:  # U-Net深度学习
                 model_type = self.unet_model_combo.currentIndex()
                 confidence = self.unet_confidence_slider.value() / 100.0
-                params = {"model_type": model_type, "confidence": confidence}
+                tiled = self.unet_tiled_checkbox.isChecked()
+                params = {"model_type": model_type, "confidence": confidence, "tiled": tiled}
+            elif index == 5:  # 水平集
+                iterations = self.level_set_iterations_slider.value()
+                mu = self.level_set_mu_slider.value() / 100.0
+                band_width = self.level_set_band_slider.value()
+                params = {"iterations": iterations, "mu": mu, "band_width": band_width}
             
-            # 应用分割算法
-            self.processed_image = algorithm.process(input_image, **params)
+            # 主动轮廓手动初始化：在原始图像上选点，选点完成后再启动分割
+            if index == 3 and manual_init:
+                self.pending_segmentation = (index, input_image, params)
+                self.apply_segmentation_button.setEnabled(False)
+                self.original_viewer.start_point_selection(min_points=6)
+                self.statusBar().showMessage("请在原始图像上左键点击选择至少6个初始轮廓点，右键或回车确认，Esc取消")
+                return
             
-            # 显示处理后的图像
-            self.processed_viewer.set_image(self.processed_image)
+            self.start_segmentation(index, input_image, params)
+        
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"应用分割算法时出错: {str(e)}")
+    
+    def threshold_histogram(self):
+        """
+        返回当前分割输入图像的阈值直方图，输入图像不变时复用，没有图像时返回None
+        """
+        if self.original_image is None:
+            return None
+        image = self.processed_image if self.processed_image is not None else self.original_image_gray
+        if self.threshold_histogram_cache is None or self.threshold_histogram_cache[0] is not image:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) > 2 else image
+            self.threshold_histogram_cache = (image, ThresholdHistogram(gray))
+        return self.threshold_histogram_cache[1]
+    
+    def update_threshold_method(self, method_index):
+        """
+        切换阈值方法：自动方法由直方图计算阈值并同步到滑块
+        """
+        method = self.THRESHOLD_METHODS[method_index]
+        local = method in Thresholding.LOCAL_METHODS
+        self.threshold_slider.setEnabled(method == "manual")
+        self.threshold_type_combo.setEnabled(method != "multi_otsu")
+        self.threshold_window_slider.setEnabled(local)
+        self.threshold_k_slider.setEnabled(method in ("niblack", "sauvola"))
+        self.threshold_offset_slider.setEnabled(method == "adaptive_mean")
+        histogram = self.threshold_histogram()
+        if histogram is not None and method in ("otsu", "triangle", "li"):
+            # 整数灰度下 gray > t 与 gray > floor(t) 等价
+            self.threshold_slider.setValue(int(histogram.threshold(method)))
+        self.update_threshold_preview()
+    
+    def update_threshold_preview(self):
+        """
+        更新阈值分割的前景占比预览，只查询直方图，不访问像素
+        """
+        if self.segmentation_combo.currentIndex() != 0:
+            return
+        histogram = self.threshold_histogram()
+        if histogram is None:
+            self.threshold_preview_value.setText("-")
+            return
+        method = self.THRESHOLD_METHODS[self.threshold_method_combo.currentIndex()]
+        if method in Thresholding.LOCAL_METHODS:
+            # 局部阈值逐像素不同，无法由全局直方图预览
+            self.threshold_preview_value.setText("逐像素局部阈值")
+        elif method == "multi_otsu":
+            thresholds = histogram.multi_otsu(3)
+            self.threshold_preview_value.setText(f"阈值 {'、'.join(str(t) for t in thresholds)}")
+        else:
+            fraction = histogram.foreground_count(self.threshold_slider.value()) / histogram.total
+            self.threshold_preview_value.setText(f"{fraction * 100:.1f}%")
+    
+    def start_segmentation(self, index, input_image, params):
+        """
+        在后台线程中运行分割算法，界面保持响应
+        """
+        if self.is_segmentation_running():
+            # 同一时间只运行一个分割线程，算法实例和后处理的状态不能被两个线程同时修改
+            return
+        algorithm = self.segmentation_algorithms[index]
+        self.apply_segmentation_button.setEnabled(False)
+        self.statusBar().showMessage(f"正在应用{self.segmentation_combo.itemText(index)}分割...")
+        
+        postprocessing = None
+        if self.postprocess_checkbox.isChecked():
+            postprocessing = (self.mask_postprocessing, {"keep_largest": self.postprocess_keep_slider.value(),
+                                                         "smooth_radius": self.postprocess_smooth_slider.value()})
+        postprocessed = postprocessing is not None
+        generation = self.segmentation_generation
+        
+        self.segmentation_worker = ProcessingWorker(algorithm, input_image, params, self, postprocessing)
+        self.segmentation_worker.result_ready.connect(
+            lambda result: self.on_segmentation_finished(index, result, postprocessed, generation)
+        )
+        self.segmentation_worker.error.connect(lambda message: self.on_segmentation_failed(message, generation))
+        self.segmentation_worker.finished.connect(self.on_segmentation_thread_finished)
+        self.segmentation_worker.start()
+    
+    def is_segmentation_running(self):
+        """
+        后台分割线程是否仍在运行
+        """
+        return self.segmentation_worker is not None and self.segmentation_worker.isRunning()
+    
+    def on_segmentation_thread_finished(self):
+        """
+        后台分割线程结束 (包括结果已被丢弃的旧任务)，有图像时重新启用分割按钮
+        """
+        self.apply_segmentation_button.setEnabled(self.original_image is not None)
+    
+    def on_contour_points_selected(self, points):
+        """
+        初始轮廓选点完成，启动主动轮廓分割
+        """
+        if self.pending_segmentation is None:
+            return
+        index, input_image, params = self.pending_segmentation
+        self.pending_segmentation = None
+        self.start_segmentation(index, input_image, dict(params, init_points=points))
+    
+    def on_contour_selection_cancelled(self):
+        """
+        取消选点时使用默认椭圆初始轮廓
+        """
+        if self.pending_segmentation is None:
+            return
+        index, input_image, params = self.pending_segmentation
+        self.pending_segmentation = None
+        self.start_segmentation(index, input_image, params)
+    
+    def on_segmentation_finished(self, index, result, postprocessed, generation):
+        """
+        后台分割完成，显示结果；任务启动后加载了新图像或重置过时丢弃结果
+        """
+        if generation != self.segmentation_generation or self.original_image is None:
+            return
+        self.processed_image = result
             
-            # 启用保存按钮和保存菜单项
-            self.save_button.setEnabled(True)
-            self.save_action.setEnabled(True)
+        # 显示处理后的图像
+        self.processed_viewer.set_image(self.processed_image)
             
-            self.statusBar().showMessage(f"已应用{self.segmentation_combo.currentText()}分割")
+        # 启用保存按钮和保存菜单项
+        self.save_button.setEnabled(True)
+        self.save_action.setEnabled(True)
             
-            # 记录当前处理
-            self.current_segmentation = index
+        algorithm = self.segmentation_algorithms[index]
+        message = f"已应用{self.segmentation_combo.itemText(index)}分割"
+        if index == 3 and algorithm.last_stats:
+            # 显示主动轮廓每层的迭代次数和耗时
+            levels = "，".join(f"第{s['level']}层{s['iterations']}次/{s['time'] * 1000:.0f}ms" for s in algorithm.last_stats)
+            message += f" ({levels})"
+        elif index == 2 and algorithm.last_cache_hit:
+            # 显示复用缓存的各预处理阶段节省的时间
+            names = {"threshold": "阈值", "opening": "开运算", "sure_bg": "确定背景", "distance_transform": "距离变换"}
+            saved = "，".join(f"{names[k]}{algorithm.last_stage_times[k] * 1000:.1f}ms" for k in algorithm.STAGES)
+            message += f" (复用缓存，节省{saved})"
+        elif index == 0 and algorithm.last_threshold is not None:
+            # 显示实际使用的阈值 (自动阈值方法由直方图计算)
+            threshold = algorithm.last_threshold
+            if isinstance(threshold, list):
+                message += f" (阈值{'、'.join(str(t) for t in threshold)})"
+            else:
+                message += f" (阈值{threshold:g})"
+        elif index == 5 and algorithm.last_stats:
+            # 显示水平集的迭代次数、平均窄带大小和每次迭代耗时
+            stats = algorithm.last_stats
+            band = sum(s["band"] for s in stats) / len(stats)
+            per_iter = sum(s["time"] for s in stats) / len(stats)
+            message += f" (迭代{len(stats)}次，平均窄带{band:.0f}像素，{per_iter * 1000:.2f}ms/次，重新初始化{algorithm.last_reinits}次)"
+        if postprocessed:
+            # 显示后处理保留的区域数和填充的孔洞像素数
+            stats = self.mask_postprocessing.last_stats
+            message += f"，后处理保留{stats['kept']}/{stats['components']}个区域，填充孔洞{stats['filled']}像素"
+        self.statusBar().showMessage(message)
             
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"应用分割算法时出错: {str(e)}")
+        # 记录当前处理
+        self.current_segmentation = index
+        self.update_threshold_preview()
+            
+    def on_segmentation_failed(self, message, generation):
+        """
+        后台分割出错；旧任务的错误不再提示
+        """
+        if generation != self.segmentation_generation:
+            return
+        QMessageBox.critical(self, "错误", f"应用分割算法时出错: {message}")
     
     def save_result(self):
         if self.processed_image is None:
@@ -967,6 +1574,11 @@ class MainWindow(QMainWindow):
     
     def reset(self):
         if self.original_image is not None:
+            # 结束未完成的选点，丢弃正在运行的分割的结果
+            self.original_viewer.stop_point_selection()
+            self.pending_segmentation = None
+            self.segmentation_generation += 1
+            self.apply_segmentation_button.setEnabled(not self.is_segmentation_running())
             # 重新显示原图
             self.original_viewer.set_image(self.original_image)
             # 清空处理后的图像
@@ -978,6 +1590,7 @@ class MainWindow(QMainWindow):
             # 重置当前处理状态
             self.current_enhancement = None
             self.current_segmentation = None
+            self.update_threshold_preview()
             # 更新状态栏
             self.statusBar().showMessage("已重置")
             # 确保处理后的图像视图被清空
@@ -986,6 +1599,16 @@ class MainWindow(QMainWindow):
             self.processed_viewer.figure.clear()
             self.processed_viewer.canvas.draw()
     
+    def closeEvent(self, event):
+        """
+        关闭窗口前等待后台分割线程结束，结果直接丢弃
+        """
+        self.segmentation_generation += 1
+        if self.is_segmentation_running():
+            self.statusBar().showMessage("正在等待分割完成...")
+            self.segmentation_worker.wait()
+        super().closeEvent(event)
+    
     def create_menu_bar(self):
         """
         创建菜单栏
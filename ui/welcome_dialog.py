@@ -106,7 +106,7 @@ class WelcomeDialog(QDialog):
         
         <p><b>主要功能：</b></p>
         <ul>
-            <li><b>图像增强</b> - 提供5种不同的增强算法，改善X-Ray图像的质量和可视性</li>
+            <li><b>图像增强</b> - 提供6种不同的增强算法，改善X-Ray图像的质量和可视性</li>
             <li><b>肺叶分割</b> - 提供5种不同的分割算法，用于识别和分离肺部区域</li>
             <li><b>图像处理</b> - 直观的用户界面，实时直方图显示，处理前后对比</li>
         </ul>